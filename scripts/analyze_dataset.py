@@ -6,16 +6,22 @@ from __future__ import annotations
 import argparse
 import json
 import logging
+import math
+import os
+import struct
 import sys
-from collections import Counter, defaultdict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
 import cv2
 import numpy as np
 import yaml
 from PIL import Image
 
+from prepare_rdd2022 import load_split_table
+
 
 def configure_logger(verbose: bool) -> None:
     level = logging.DEBUG if verbose else logging.INFO
@@ -33,6 +39,41 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--split", choices=["train", "val", "test", "all"], default="all", help="Split to analyze.")
     parser.add_argument("--check-images", dest="check_images", action="store_true", help="Verify image files exist.")
     parser.add_argument("--check-annotations", dest="check_annotations", action="store_true", help="Verify annotation files.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="Worker processes used to probe image headers for --check-images.",
+    )
+    parser.add_argument(
+        "--no-table",
+        dest="use_table",
+        action="store_false",
+        help="Read .txt labels even when a columnar annotations/<split>.npz table exists.",
+    )
+    parser.add_argument(
+        "--box-shapes",
+        dest="box_shapes",
+        action="store_true",
+        help="Report IoU k-means anchors and small-box fractions per class and overall.",
+    )
+    parser.add_argument("--anchors", type=int, default=9, help="Number of box-shape clusters for --box-shapes.")
+    parser.add_argument(
+        "--imgsz-candidates",
+        dest="imgsz_candidates",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_IMGSZ_CANDIDATES),
+        help="Training sizes at which --box-shapes reports small-box fractions.",
+    )
+    parser.add_argument(
+        "--fix",
+        action="store_true",
+        help=(
+            "Rewrite label files with invalid annotations: drop unknown-class, empty and duplicate boxes, "
+            "clip the rest. Files with unparseable lines are reported, not rewritten."
+        ),
+    )
     parser.add_argument("--verbose", action="store_true", help="Enable debug logging.")
     return parser.parse_args()
 
@@ -69,36 +110,706 @@ def parse_yolo_label(label_path: Path) -> List[Dict]:
     return annotations
 
 
+def malformed_label_lines(label_path: Path) -> List[Dict]:
+    """Lines of a label file that :func:`parse_yolo_label` drops.
+
+    A non-blank line is dropped for a field count other than five or for a
+    field ``int``/``float`` rejects; since the parser stops at the first
+    such field, every line after it is dropped as well.
+    """
+    malformed = []
+    failed = False
+    try:
+        with open(label_path, "r") as f:
+            for number, line in enumerate(f, start=1):
+                parts = line.strip().split()
+                if not parts:
+                    continue
+                reason = None
+                if failed:
+                    reason = "after_parse_error"
+                elif len(parts) != 5:
+                    reason = "field_count"
+                else:
+                    try:
+                        int(parts[0])
+                        for part in parts[1:]:
+                            float(part)
+                    except ValueError:
+                        reason = "not_numeric"
+                        failed = True
+                if reason:
+                    malformed.append({"line": number, "text": line.strip(), "reason": reason})
+    except OSError:
+        pass
+    return malformed
+
+
+LABEL_COLUMNS = ("image_index", "class_id", "x_center", "y_center", "width", "height")
+
+
+def annotations_to_rows(image_index: int, annotations: List[Dict]) -> np.ndarray:
+    return np.array(
+        [
+            (image_index, ann["class_id"], ann["x_center"], ann["y_center"], ann["width"], ann["height"])
+            for ann in annotations
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 6)
+
+
+def load_yolo_labels(
+    label_files: List[Path], malformed: Optional[Dict[int, List[Dict]]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Read the label files of a split into one ``(N, 6)`` array.
+
+    Columns are :data:`LABEL_COLUMNS`; ``image_index`` is the position of the
+    label file in ``label_files``. Returns the array and a boolean mask of the
+    label files that exist. Well-formed files (five fields on every non-blank
+    line) are converted in one bulk NumPy call; any other file goes through
+    :func:`parse_yolo_label` so malformed lines are handled the same way.
+    With ``malformed``, the lines that parser drops (see
+    :func:`malformed_label_lines`) are stored under each file's position.
+    """
+    exists = np.zeros(len(label_files), dtype=bool)
+    tokens: List[str] = []
+    token_counts: List[int] = []
+    token_owners: List[int] = []
+    slow_rows: List[np.ndarray] = []
+    slow_files: List[int] = []
+    for index, label_file in enumerate(label_files):
+        try:
+            with open(label_file, "r") as f:
+                text = f.read()
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            exists[index] = True
+            logging.warning("Error parsing label file %s: %s", label_file, e)
+            continue
+        exists[index] = True
+        fields = text.split()
+        if not fields:
+            continue
+        # Blank lines are skipped like parse_yolo_label does; any other width is malformed.
+        if {len(line.split()) for line in text.split("\n")} <= {0, 5}:
+            tokens.extend(fields)
+            token_counts.append(len(fields) // 5)
+            token_owners.append(index)
+        else:
+            slow_rows.append(annotations_to_rows(index, parse_yolo_label(label_file)))
+            slow_files.append(index)
+
+    fast = np.empty((0, 6), dtype=np.float64)
+    if tokens:
+        try:
+            values = np.array(tokens, dtype=np.float64).reshape(-1, 5)
+            if not np.char.isdigit(np.array(tokens[0::5])).all():
+                raise ValueError("non-integer class id")
+            owners = np.repeat(np.array(token_owners, dtype=np.float64), token_counts)
+            fast = np.column_stack([owners, values])
+        except ValueError:
+            # Some file has a field int()/float() rejects; let the per-line parser decide.
+            slow_rows.extend(annotations_to_rows(index, parse_yolo_label(label_files[index])) for index in token_owners)
+            slow_files.extend(token_owners)
+    if malformed is not None:
+        for index in slow_files:
+            lines = malformed_label_lines(label_files[index])
+            if lines:
+                malformed[index] = lines
+    rows = np.concatenate([fast, *slow_rows]) if slow_rows else fast
+    return rows[np.argsort(rows[:, 0], kind="stable")], exists
+
+
+def index_table_labels(
+    table: Dict[str, np.ndarray], image_files: List[Path]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Map the annotations of a columnar split table onto ``image_files``.
+
+    Returns the image index of each covered annotation in ascending order,
+    the table rows in that same order, and a mask of the images the table
+    covers. Rows are materialised per slice with :func:`table_label_rows`.
+    """
+    position = {Path(str(image_path)).stem: image_id for image_id, image_path in enumerate(table["image_path"])}
+    table_to_image = np.full(len(table["image_path"]), -1, dtype=np.int64)
+    covered = np.zeros(len(image_files), dtype=bool)
+    for index, img_file in enumerate(image_files):
+        image_id = position.get(img_file.stem)
+        if image_id is not None:
+            table_to_image[image_id] = index
+            covered[index] = True
+    image_index = table_to_image[table["image_id"]]
+    order = np.flatnonzero(image_index >= 0)
+    order = order[np.argsort(image_index[order], kind="stable")]
+    return image_index[order], order, covered
+
+
+def table_label_rows(table: Dict[str, np.ndarray], image_index: np.ndarray, order: np.ndarray) -> np.ndarray:
+    """Rows of a table slice (from :func:`index_table_labels`) as :func:`load_yolo_labels` would return them."""
+    return np.column_stack(
+        [image_index.astype(np.float64)]
+        + [table[key][order].astype(np.float64) for key in ("class_id", "x_center", "y_center", "width", "height")]
+    ).reshape(-1, 6)
+
+
+def table_image_sizes(table: Dict[str, np.ndarray], image_files: List[Path]) -> np.ndarray:
+    """``(len(image_files), 2)`` width/height from a split table; NaN where unknown."""
+    sizes = np.full((len(image_files), 2), np.nan)
+    position = {Path(str(image_path)).stem: image_id for image_id, image_path in enumerate(table["image_path"])}
+    for index, img_file in enumerate(image_files):
+        image_id = position.get(img_file.stem)
+        if image_id is not None and table["image_width"][image_id] > 0 and table["image_height"][image_id] > 0:
+            sizes[index] = table["image_width"][image_id], table["image_height"][image_id]
+    return sizes
+
+
+PROBE_CACHE_NAME = ".image_sizes.json"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Start-of-frame markers carry the frame size; DHT (C4), JPG (C8) and DAC (CC) share the range but do not.
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+
+def _jpeg_size(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            return None  # End of image or start of scan before any frame header.
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">xHH", frame)
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def probe_image_size(path: Path) -> Union[Tuple[int, int], str]:
+    """Image ``(width, height)`` from the file header, or an error message.
+
+    JPEG and PNG sizes are read directly from the frame header / IHDR chunk
+    without building a PIL image. Other formats, and headers this parser
+    cannot read, fall back to ``Image.open`` so the verdict matches PIL's.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(24)
+            size = None
+            if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR":
+                size = struct.unpack(">II", head[16:24])
+            elif head.startswith(b"\xff\xd8"):
+                size = _jpeg_size(f)
+            if size and size[0] > 0 and size[1] > 0:
+                return int(size[0]), int(size[1])
+        with Image.open(path) as img:
+            return img.size
+    except Exception as e:
+        return str(e)
+
+
+def _probe_chunk(paths: Sequence[Path]) -> List[Union[Tuple[int, int], str]]:
+    return [probe_image_size(path) for path in paths]
+
+
+def probe_image_sizes(
+    image_files: Sequence[Path], jobs: int = 1, cache_path: Optional[Path] = None
+) -> List[Union[Tuple[int, int], str]]:
+    """Probe many image headers, reusing results cached by (path, size, mtime).
+
+    Returns ``(width, height)`` or an error message per image. Uncached images
+    are probed in a process pool, which hides per-file latency on network
+    storage.
+    """
+    cache: Dict[str, List] = {}
+    if cache_path is not None and cache_path.exists():
+        try:
+            cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        except ValueError:
+            cache = {}
+
+    results: List[Union[Tuple[int, int], str, None]] = [None] * len(image_files)
+    stamps: List[Tuple[int, int]] = []
+    todo: List[int] = []
+    for index, img_file in enumerate(image_files):
+        try:
+            st = img_file.stat()
+        except OSError as e:
+            stamps.append((-1, -1))
+            results[index] = str(e)
+            continue
+        stamps.append((st.st_size, st.st_mtime_ns))
+        cached = cache.get(str(img_file))
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            results[index] = tuple(cached[2]) if isinstance(cached[2], list) else cached[2]
+        else:
+            todo.append(index)
+    logging.info("Probing %d image headers (%d cached)", len(todo), len(image_files) - len(todo))
+
+    paths = [image_files[i] for i in todo]
+    if jobs > 1 and len(paths) > 1:
+        chunk_size = max(1, -(-len(paths) // (jobs * 8)))
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        probed: List[Union[Tuple[int, int], str]] = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for chunk_result in executor.map(_probe_chunk, chunks):
+                probed.extend(chunk_result)
+    else:
+        probed = _probe_chunk(paths)
+    for index, result in zip(todo, probed):
+        results[index] = result
+
+    if cache_path is not None and todo:
+        for img_file, (size, mtime_ns), result in zip(image_files, stamps, results):
+            if size >= 0:
+                cache[str(img_file)] = [size, mtime_ns, list(result) if isinstance(result, tuple) else result]
+        try:
+            tmp_path = cache_path.with_name(f".{cache_path.name}.tmp")
+            tmp_path.write_text(json.dumps(cache), encoding="utf-8")
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning("Could not save image size cache %s: %s", cache_path, e)
+    return results
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded memory (KLL-style compactors).
+
+    Values are kept exactly until ``capacity`` of them are buffered; after
+    that, full levels are sorted and every other value is promoted to the next
+    level with doubled weight, so memory stays around ``2 * capacity`` values
+    whatever the stream length. Compaction offsets alternate per level, which
+    keeps results deterministic.
+    """
+
+    def __init__(self, capacity: int = 8192) -> None:
+        self.capacity = capacity
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._offsets: List[int] = [0]
+
+    def update(self, values: np.ndarray) -> None:
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64).ravel()])
+        self._compact()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+                self._offsets.append(0)
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self._compact()
+
+    def _compact(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.capacity:
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                    self._offsets.append(0)
+                values = np.sort(self.levels[level])
+                if len(values) % 2:
+                    self.levels[level], values = values[-1:], values[:-1]
+                else:
+                    self.levels[level] = np.empty(0)
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], values[self._offsets[level]::2]])
+                self._offsets[level] ^= 1
+            level += 1
+
+    def quantile(self, q: float) -> float:
+        if len(self.levels) == 1:
+            return float(np.quantile(self.levels[0], q))  # Still exact.
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 2.0 ** level) for level, values in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        return float(values[order][np.searchsorted(cumulative, q * cumulative[-1])])
+
+
+class RunningStats:
+    """Streaming, mergeable summary of one numeric column.
+
+    Mean and variance use Welford/Chan updates, min/max are exact, the median
+    comes from a :class:`QuantileSketch`, and ``bin_edges`` define a fixed-bin
+    histogram whose end bins also collect values outside the edges. Two
+    instances fed disjoint parts of a column merge into the same moments,
+    extrema and histogram as one instance fed the whole column.
+    """
+
+    def __init__(self, bin_edges: Sequence[float]) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.histogram = np.zeros(len(self.bin_edges) - 1, dtype=np.int64)
+        self.sketch = QuantileSketch()
+
+    def update(self, values) -> None:
+        arr = np.asarray(values, dtype=np.float64).ravel()
+        if arr.size == 0:
+            return
+        mean = float(np.mean(arr))
+        self._merge_moments(arr.size, mean, float(np.sum((arr - mean) ** 2)))
+        self.min = min(self.min, float(np.min(arr)))
+        self.max = max(self.max, float(np.max(arr)))
+        clipped = np.clip(arr, self.bin_edges[0], self.bin_edges[-1])
+        self.histogram += np.histogram(clipped, bins=self.bin_edges)[0]
+        self.sketch.update(arr)
+
+    def merge(self, other: "RunningStats") -> None:
+        if other.count == 0:
+            return
+        self._merge_moments(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+        self.sketch.merge(other.sketch)
+
+    def _merge_moments(self, count: int, mean: float, m2: float) -> None:
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def to_dict(self) -> Dict:
+        if self.count == 0:
+            return {}
+        return {
+            "mean": self.mean,
+            "std": math.sqrt(self.m2 / self.count),
+            "min": self.min,
+            "max": self.max,
+            "median": self.sketch.quantile(0.5),
+            "histogram": {"bin_edges": self.bin_edges.tolist(), "counts": self.histogram.tolist()},
+        }
+
+
+UNIT_BINS = np.linspace(0.0, 1.0, 51)
+BBOX_BIN_EDGES = {
+    "areas": UNIT_BINS,
+    "widths": UNIT_BINS,
+    "heights": UNIT_BINS,
+    "aspect_ratios": np.concatenate([[0.0], np.logspace(-2, 2, 41)]),
+}
+IMAGE_BIN_EDGES = {
+    "widths": np.arange(0, 4096 + 128, 128),
+    "heights": np.arange(0, 4096 + 128, 128),
+    "aspect_ratios": np.linspace(0.0, 4.0, 41),
+}
+LABEL_CHUNK_SIZE = 8192
+
+
+def bounded_map(func: Callable[[Any], Any], items: Iterable[Any], executor: ThreadPoolExecutor, window: int) -> Iterator[Any]:
+    """``executor.map`` that keeps at most ``window`` results in flight.
+
+    ``Executor.map`` submits everything up front, so finished results pile
+    up whenever the workers outpace the consumer.
+    """
+    pending: deque = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def new_bbox_stats() -> Dict[str, RunningStats]:
+    return {key: RunningStats(edges) for key, edges in BBOX_BIN_EDGES.items()}
+
+
+def update_bbox_stats(bbox_stats: Dict[str, RunningStats], rows: np.ndarray) -> None:
+    """Feed the normalized boxes of label rows (see :data:`LABEL_COLUMNS`) into ``bbox_stats``."""
+    widths, heights = rows[:, 4], rows[:, 5]
+    safe_heights = np.where(heights > 0, heights, 1.0)
+    bbox_stats["areas"].update(widths * heights)
+    bbox_stats["widths"].update(widths)
+    bbox_stats["heights"].update(heights)
+    bbox_stats["aspect_ratios"].update(np.where(heights > 0, widths / safe_heights, 0.0))
+
+
+def wh_iou(boxes: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """IoU between ``(N, 2)`` and ``(K, 2)`` width/height pairs aligned at a common center."""
+    inter = np.minimum(boxes[:, None, 0], centroids[None, :, 0]) * np.minimum(boxes[:, None, 1], centroids[None, :, 1])
+    union = boxes[:, None, 0] * boxes[:, None, 1] + centroids[None, :, 0] * centroids[None, :, 1] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1.0), 0.0)
+
+
+def kmeans_iou(
+    shapes: np.ndarray,
+    k: int,
+    batch_size: int = 4096,
+    iterations: int = 200,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Mini-batch k-means over box shapes with ``1 - IoU`` as the distance.
+
+    Centroids are seeded with k-means++ on a subsample, then moved towards the
+    mean of their points in random mini-batches with per-centroid learning
+    rates (Sculley 2010). Returns centroids sorted by area and each shape's
+    cluster.
+    """
+    rng = np.random.default_rng(seed)
+    unique = np.unique(shapes, axis=0)
+    if len(unique) <= k:
+        centroids = unique
+    else:
+        pool = shapes[rng.choice(len(shapes), min(len(shapes), 20 * batch_size), replace=False)]
+        centroids = pool[rng.integers(len(pool))][None, :]
+        for _ in range(1, k):
+            distance = 1.0 - wh_iou(pool, centroids).max(axis=1)
+            weights = distance ** 2
+            if weights.sum() <= 0:
+                break
+            centroids = np.vstack([centroids, pool[rng.choice(len(pool), p=weights / weights.sum())]])
+        counts = np.zeros(len(centroids))
+        for _ in range(iterations):
+            batch = shapes[rng.choice(len(shapes), min(len(shapes), batch_size), replace=False)]
+            nearest = wh_iou(batch, centroids).argmax(axis=1)
+            batch_counts = np.bincount(nearest, minlength=len(centroids)).astype(np.float64)
+            sums = np.stack([np.bincount(nearest, weights=batch[:, dim], minlength=len(centroids)) for dim in range(2)], axis=1)
+            counts += batch_counts
+            moved = batch_counts > 0
+            previous = centroids.copy()
+            centroids[moved] += (sums[moved] - batch_counts[moved, None] * centroids[moved]) / counts[moved, None]
+            if np.abs(centroids - previous).max() < 1e-7:
+                break
+    centroids = centroids[np.argsort(centroids[:, 0] * centroids[:, 1])]
+    clusters = np.concatenate(
+        [wh_iou(shapes[start:start + 65536], centroids).argmax(axis=1) for start in range(0, len(shapes), 65536)]
+    ) if len(shapes) else np.zeros(0, dtype=np.int64)
+    return centroids, clusters
+
+
+SMALL_BOX_THRESHOLDS = (8, 16, 32)
+DEFAULT_IMGSZ_CANDIDATES = (320, 416, 512, 640, 800, 1024, 1280)
+
+
+class BoxShapeSampler:
+    """Streaming collector for the box-shape report.
+
+    Shapes are letterbox-normalized: width and height as fractions of the
+    image's long side, so multiplying by ``imgsz`` gives the box size in
+    training pixels (images of unknown size are treated as square). Every box
+    is counted exactly towards the small-box fractions, while k-means runs on
+    a uniform sample of at most ``capacity`` shapes per class and overall,
+    kept by lowest random key so that merged samplers hold a uniform sample
+    of the union.
+    """
+
+    def __init__(
+        self,
+        anchors: int = 9,
+        imgsz_candidates: Sequence[int] = DEFAULT_IMGSZ_CANDIDATES,
+        capacity: int = 200_000,
+        seed: int = 0,
+    ) -> None:
+        self.anchors = anchors
+        self.imgsz_candidates = list(imgsz_candidates)
+        self.capacity = capacity
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.samples: Dict[Union[int, str], Tuple[np.ndarray, np.ndarray]] = {}
+        self.box_counts: Dict[Union[int, str], int] = {}
+        self.small_counts: Dict[Union[int, str], np.ndarray] = {}
+        self.assumed_square = 0
+
+    def empty_copy(self) -> "BoxShapeSampler":
+        return BoxShapeSampler(self.anchors, self.imgsz_candidates, self.capacity, self.seed + 1)
+
+    def update(self, rows: np.ndarray, image_sizes: np.ndarray) -> None:
+        """Add label rows (see :data:`LABEL_COLUMNS`) with the ``(N, 2)`` size of each row's image."""
+        if len(rows) == 0:
+            return
+        known = np.all(image_sizes > 0, axis=1)
+        self.assumed_square += int(np.count_nonzero(~known))
+        sizes = np.where(known[:, None], image_sizes, 1.0)
+        shapes = rows[:, 4:6] * sizes / sizes.max(axis=1, keepdims=True)
+        keys = self.rng.random(len(rows))
+        side = np.sqrt(shapes[:, 0] * shapes[:, 1])
+        imgsz = np.array(self.imgsz_candidates, dtype=np.float64)
+        thresholds = np.array(SMALL_BOX_THRESHOLDS, dtype=np.float64)
+        small = (side[:, None, None] * imgsz[None, :, None]) < thresholds[None, None, :]
+        class_ids = rows[:, 1].astype(np.int64)
+        for group in ["all", *np.unique(class_ids).tolist()]:
+            mask = slice(None) if group == "all" else class_ids == group
+            self._add(group, shapes[mask], keys[mask], int(small[mask].shape[0]), small[mask].sum(axis=0))
+
+    def merge(self, other: "BoxShapeSampler") -> None:
+        self.assumed_square += other.assumed_square
+        for group, (shapes, keys) in other.samples.items():
+            self._add(group, shapes, keys, other.box_counts[group], other.small_counts[group])
+
+    def _add(self, group: Union[int, str], shapes: np.ndarray, keys: np.ndarray, count: int, small: np.ndarray) -> None:
+        if group in self.samples:
+            old_shapes, old_keys = self.samples[group]
+            shapes, keys = np.concatenate([old_shapes, shapes]), np.concatenate([old_keys, keys])
+            self.box_counts[group] += count
+            self.small_counts[group] = self.small_counts[group] + small
+        else:
+            self.box_counts[group] = count
+            self.small_counts[group] = np.asarray(small)
+        if len(keys) > self.capacity:
+            keep = np.argpartition(keys, self.capacity)[: self.capacity]
+            shapes, keys = shapes[keep], keys[keep]
+        self.samples[group] = (shapes, keys)
+
+    def report(self) -> Dict:
+        def summarize(group: Union[int, str]) -> Dict:
+            shapes, _ = self.samples[group]
+            centroids, clusters = kmeans_iou(shapes, self.anchors, seed=self.seed)
+            best_iou = wh_iou(shapes, centroids).max(axis=1) if len(shapes) else np.zeros(0)
+            small = self.small_counts[group] / max(1, self.box_counts[group])
+            return {
+                "boxes": self.box_counts[group],
+                "sampled": len(shapes),
+                "anchors": np.round(centroids, 6).tolist(),
+                "cluster_sizes": np.bincount(clusters, minlength=len(centroids)).tolist(),
+                "mean_best_iou": float(best_iou.mean()) if len(best_iou) else 0.0,
+                "anchors_px": {
+                    str(size): np.round(centroids * size, 1).tolist() for size in self.imgsz_candidates
+                },
+                "small_box_fraction": {
+                    str(size): {f"<{t}px": float(small[i, j]) for j, t in enumerate(SMALL_BOX_THRESHOLDS)}
+                    for i, size in enumerate(self.imgsz_candidates)
+                },
+            }
+
+        if "all" not in self.samples:
+            return {}
+        return {
+            "units": "fraction of image long side",
+            "boxes_with_unknown_image_size": self.assumed_square,
+            "overall": summarize("all"),
+            "per_class": {
+                group: summarize(group) for group in sorted(key for key in self.samples if key != "all")
+            },
+        }
+
+
+LABEL_ISSUES = ("unknown_class", "out_of_range", "non_positive_size", "past_image_edge", "duplicate")
+EDGE_TOLERANCE = 1e-6
+
+
+def validate_label_rows(rows: np.ndarray, num_classes: int, duplicate_iou: float = 0.95) -> np.ndarray:
+    """Flag problems in label rows (see :data:`LABEL_COLUMNS`) sorted by image.
+
+    Returns an ``(N, len(LABEL_ISSUES))`` boolean array. A box is a
+    ``duplicate`` when an earlier box of the same image and class overlaps it
+    with IoU above ``duplicate_iou``. Duplicates are found by comparing each
+    box with the next boxes of its (image, class) run, one offset at a time,
+    so no per-image Python loop is needed.
+    """
+    class_ids, coords = rows[:, 1], rows[:, 2:6]
+    x, y, w, h = coords.T
+    issues = np.zeros((len(rows), len(LABEL_ISSUES)), dtype=bool)
+    issues[:, 0] = (class_ids != np.round(class_ids)) | (class_ids < 0) | (class_ids >= num_classes)
+    issues[:, 1] = ~np.all((coords >= 0.0) & (coords <= 1.0), axis=1)
+    issues[:, 2] = ~((w > 0) & (h > 0))
+    issues[:, 3] = (x - w / 2 < -EDGE_TOLERANCE) | (x + w / 2 > 1 + EDGE_TOLERANCE) | (
+        (y - h / 2 < -EDGE_TOLERANCE) | (y + h / 2 > 1 + EDGE_TOLERANCE)
+    )
+
+    order = np.lexsort((np.arange(len(rows)), class_ids, rows[:, 0]))
+    keys = rows[order][:, :2]
+    boxes = np.column_stack([x - w / 2, y - h / 2, x + w / 2, y + h / 2])[order]
+    offset = 1
+    while offset < len(rows):
+        same = np.all(keys[offset:] == keys[:-offset], axis=1)
+        if not same.any():
+            break
+        first, second = np.flatnonzero(same), np.flatnonzero(same) + offset
+        a, b = boxes[first], boxes[second]
+        inter = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None) * np.clip(
+            np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None
+        )
+        union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter
+        duplicate = (union > 0) & (inter > duplicate_iou * np.where(union > 0, union, 1.0))
+        issues[order[second[duplicate]], 4] = True
+        offset += 1
+    return issues
+
+
+def fix_label_rows(rows: np.ndarray, issues: np.ndarray) -> np.ndarray:
+    """Repaired label rows: drop unknown-class, empty and duplicate boxes, clip the rest to the image."""
+    keep = ~(issues[:, 0] | issues[:, 2] | issues[:, 4]) & np.all(np.isfinite(rows), axis=1)
+    rows = rows[keep].copy()
+    x, y, w, h = rows[:, 2:6].T
+    x1, y1 = np.clip(x - w / 2, 0.0, 1.0), np.clip(y - h / 2, 0.0, 1.0)
+    x2, y2 = np.clip(x + w / 2, 0.0, 1.0), np.clip(y + h / 2, 0.0, 1.0)
+    rows[:, 2:6] = np.column_stack([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+    return rows[(rows[:, 4] > 0) & (rows[:, 5] > 0)]
+
+
+def write_label_rows(label_file: Path, rows: np.ndarray) -> None:
+    """Atomically replace a label file with ``rows`` in YOLO text format."""
+    text = "".join(
+        f"{int(class_id)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n" for class_id, x, y, w, h in rows[:, 1:6].tolist()
+    )
+    tmp_path = label_file.with_name(f".{label_file.name}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, label_file)
+
+
 def analyze_split(
     images_dir: Path,
     labels_dir: Path,
     check_images: bool,
     check_annotations: bool,
+    table: Optional[Dict[str, np.ndarray]] = None,
+    jobs: int = 1,
+    probe_cache: Optional[Path] = None,
+    bbox_totals: Optional[Dict[str, RunningStats]] = None,
+    shape_totals: Optional[BoxShapeSampler] = None,
+    num_classes: int = 6,
+    fix: bool = False,
 ) -> Dict:
-    """Analyze a dataset split."""
+    """Analyze a dataset split.
+
+    Labels are read in chunks of :data:`LABEL_CHUNK_SIZE` images into
+    ``(N, 6)`` arrays (see :func:`load_yolo_labels`) on ``jobs`` threads, and
+    each chunk is folded into :class:`RunningStats` accumulators; at most
+    ``2 * jobs`` chunks are loaded ahead of the consumer. When ``table``
+    (from ``load_split_table``) is given, annotations are sliced from it per
+    chunk instead of opening one label file per image. Image sizes for ``check_images`` come
+    from :func:`probe_image_sizes`. ``bbox_totals``, if given, is merged with
+    this split's box statistics. With ``shape_totals``, the split also gets a
+    ``box_shapes`` report (see :class:`BoxShapeSampler`) merged into it.
+    Boxes flagged by :func:`validate_label_rows` are listed under
+    ``issues.invalid_annotations``; with ``fix``, their label files are
+    rewritten with :func:`fix_label_rows`. Label lines the parser cannot read
+    are listed under ``issues.unparseable_lines``, and files containing them
+    are never rewritten.
+    """
     stats = {
         "total_images": 0,
         "total_annotations": 0,
         "images_with_annotations": 0,
         "images_without_annotations": 0,
-        "class_distribution": Counter(),
-        "bbox_statistics": {
-            "areas": [],
-            "widths": [],
-            "heights": [],
-            "aspect_ratios": [],
-        },
+        "class_distribution": {},
+        "bbox_statistics": {},
         "issues": {
             "missing_images": [],
             "missing_labels": [],
             "invalid_annotations": [],
             "empty_images": [],
         },
-        "image_statistics": {
-            "widths": [],
-            "heights": [],
-            "aspect_ratios": [],
-        },
+        "image_statistics": {},
     }
     
     # Get all image files
@@ -107,73 +818,113 @@ def analyze_split(
     stats["total_images"] = len(image_files)
     
     logging.info("Analyzing %d images...", len(image_files))
-    
-    for img_file in image_files:
-        label_file = labels_dir / f"{img_file.stem}.txt"
-        
-        # Check if image exists and is valid
-        if check_images:
-            try:
-                img = Image.open(img_file)
-                width, height = img.size
-                stats["image_statistics"]["widths"].append(width)
-                stats["image_statistics"]["heights"].append(height)
-                stats["image_statistics"]["aspect_ratios"].append(width / height if height > 0 else 0)
-            except Exception as e:
+
+    # Check if images exist and are valid; invalid images are left out of every other statistic
+    image_stats = {key: RunningStats(edges) for key, edges in IMAGE_BIN_EDGES.items()}
+    if check_images:
+        valid_files = []
+        sizes = []
+        for img_file, result in zip(image_files, probe_image_sizes(image_files, jobs, probe_cache)):
+            if isinstance(result, str):
                 stats["issues"]["missing_images"].append(str(img_file))
-                logging.warning("Invalid image: %s - %s", img_file, e)
+                logging.warning("Invalid image: %s - %s", img_file, result)
                 continue
-        
-        # Check if label file exists
-        annotations = []
-        if label_file.exists():
-            annotations = parse_yolo_label(label_file)
-            
-            if annotations:
-                stats["images_with_annotations"] += 1
-                stats["total_annotations"] += len(annotations)
-                
-                # Analyze annotations
-                for ann in annotations:
-                    stats["class_distribution"][ann["class_id"]] += 1
-                    
-                    # Calculate bbox statistics (normalized)
-                    area = ann["width"] * ann["height"]
-                    stats["bbox_statistics"]["areas"].append(area)
-                    stats["bbox_statistics"]["widths"].append(ann["width"])
-                    stats["bbox_statistics"]["heights"].append(ann["height"])
-                    stats["bbox_statistics"]["aspect_ratios"].append(
-                        ann["width"] / ann["height"] if ann["height"] > 0 else 0
-                    )
-            else:
-                stats["images_without_annotations"] += 1
-        else:
-            stats["images_without_annotations"] += 1
+            sizes.append(result)
+            valid_files.append(img_file)
+        image_files = valid_files
+        image_sizes = np.array(sizes, dtype=np.float64).reshape(-1, 2)
+        image_stats["widths"].update(image_sizes[:, 0])
+        image_stats["heights"].update(image_sizes[:, 1])
+        safe_heights = np.where(image_sizes[:, 1] > 0, image_sizes[:, 1], 1.0)
+        image_stats["aspect_ratios"].update(np.where(image_sizes[:, 1] > 0, image_sizes[:, 0] / safe_heights, 0.0))
+    elif table is not None:
+        image_sizes = table_image_sizes(table, image_files)
+    else:
+        image_sizes = np.full((len(image_files), 2), np.nan)
+
+    if table is not None:
+        table_index, table_order, covered = index_table_labels(table, image_files)
+        table_bounds = np.searchsorted(table_index, np.arange(0, len(image_files) + LABEL_CHUNK_SIZE, LABEL_CHUNK_SIZE))
+    else:
+        covered = np.zeros(len(image_files), dtype=bool)
+
+    def load_chunk(chunk: int) -> Tuple[np.ndarray, np.ndarray, Dict[int, List[Dict]]]:
+        start = chunk * LABEL_CHUNK_SIZE
+        end = min(start + LABEL_CHUNK_SIZE, len(image_files))
+        uncovered = start + np.flatnonzero(~covered[start:end])
+        malformed: Dict[int, List[Dict]] = {}
+        rows, exists = load_yolo_labels([labels_dir / f"{image_files[i].stem}.txt" for i in uncovered], malformed)
+        rows[:, 0] = uncovered[rows[:, 0].astype(np.int64)]
+        has_label = covered[start:end].copy()
+        has_label[uncovered - start] = exists
+        if table is not None:
+            lo, hi = table_bounds[chunk], table_bounds[chunk + 1]
+            rows = np.concatenate([table_label_rows(table, table_index[lo:hi], table_order[lo:hi]), rows])
+            rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        return rows, has_label, {int(uncovered[i]): lines for i, lines in malformed.items()}
+
+    bbox_stats = new_bbox_stats()
+    shapes = shape_totals.empty_copy() if shape_totals is not None else None
+    class_counts: Dict[int, int] = {}
+    chunks = range(-(-len(image_files) // LABEL_CHUNK_SIZE))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        # Chunks come back in order, so classes keep their order of first appearance;
+        # at most two chunks per thread are held at once.
+        loaded = bounded_map(load_chunk, chunks, executor, 2 * max(1, jobs))
+        for chunk, (rows, has_label, malformed) in zip(chunks, loaded):
+            for image, lines in malformed.items():
+                label_file = labels_dir / f"{image_files[image].stem}.txt"
+                stats["issues"].setdefault("unparseable_lines", []).extend(
+                    {"label": str(label_file), **line} for line in lines
+                )
+            stats["total_annotations"] += len(rows)
+            stats["images_with_annotations"] += len(np.unique(rows[:, 0]))
             if check_annotations:
-                stats["issues"]["missing_labels"].append(str(img_file))
-    
-    # Calculate statistics
-    def calc_stats(values: List[float]) -> Dict:
-        if not values:
-            return {}
-        arr = np.array(values)
-        return {
-            "mean": float(np.mean(arr)),
-            "std": float(np.std(arr)),
-            "min": float(np.min(arr)),
-            "max": float(np.max(arr)),
-            "median": float(np.median(arr)),
-        }
-    
-    stats["bbox_statistics"] = {
-        k: calc_stats(v) for k, v in stats["bbox_statistics"].items()
-    }
-    stats["image_statistics"] = {
-        k: calc_stats(v) for k, v in stats["image_statistics"].items()
-    }
-    
-    # Convert Counter to dict
-    stats["class_distribution"] = dict(stats["class_distribution"])
+                start = chunk * LABEL_CHUNK_SIZE
+                stats["issues"]["missing_labels"].extend(str(image_files[start + i]) for i in np.flatnonzero(~has_label))
+            classes, first_seen, counts = np.unique(rows[:, 1].astype(np.int64), return_index=True, return_counts=True)
+            for i in np.argsort(first_seen):
+                class_counts[int(classes[i])] = class_counts.get(int(classes[i]), 0) + int(counts[i])
+            update_bbox_stats(bbox_stats, rows)
+            if shapes is not None:
+                shapes.update(rows, image_sizes[rows[:, 0].astype(np.int64)])
+
+            issues = validate_label_rows(rows, num_classes)
+            bad = np.flatnonzero(issues.any(axis=1))
+            if len(bad) == 0:
+                continue
+            image_index = rows[:, 0].astype(np.int64)
+            box_index = np.arange(len(rows)) - np.searchsorted(image_index, image_index)
+            for i in bad.tolist():
+                stats["issues"]["invalid_annotations"].append(
+                    {
+                        "image": str(image_files[image_index[i]]),
+                        "box_index": int(box_index[i]),
+                        "class_id": int(rows[i, 1]),
+                        "bbox": rows[i, 2:6].tolist(),
+                        "issues": [name for name, flagged in zip(LABEL_ISSUES, issues[i]) if flagged],
+                    }
+                )
+            if fix:
+                for image in np.unique(image_index[bad]).tolist():
+                    if image in malformed:
+                        # Rewriting from the parsed rows would silently drop the unparseable lines.
+                        continue
+                    own = image_index == image
+                    label_file = labels_dir / f"{image_files[image].stem}.txt"
+                    write_label_rows(label_file, fix_label_rows(rows[own], issues[own]))
+                    stats["issues"].setdefault("fixed_labels", []).append(str(label_file))
+    stats["images_without_annotations"] = len(image_files) - stats["images_with_annotations"]
+    stats["class_distribution"] = class_counts
+
+    if bbox_totals is not None:
+        for key, accumulator in bbox_stats.items():
+            bbox_totals[key].merge(accumulator)
+    stats["bbox_statistics"] = {key: accumulator.to_dict() for key, accumulator in bbox_stats.items()}
+    stats["image_statistics"] = {key: accumulator.to_dict() for key, accumulator in image_stats.items()}
+    if shapes is not None:
+        stats["box_shapes"] = shapes.report()
+        shape_totals.merge(shapes)
     
     return stats
 
@@ -202,6 +953,8 @@ def main() -> int:
     }
     
     splits_to_analyze = ["train", "val", "test"] if args.split == "all" else [args.split]
+    bbox_totals = new_bbox_stats()
+    shape_totals = BoxShapeSampler(args.anchors, args.imgsz_candidates) if args.box_shapes else None
     
     for split in splits_to_analyze:
         images_dir = base_dir / "images" / split
@@ -216,7 +969,23 @@ def main() -> int:
             continue
         
         logging.info("Analyzing %s split...", split)
-        split_stats = analyze_split(images_dir, labels_dir, args.check_images, args.check_annotations)
+        # --fix must validate the label files it rewrites, not a table built from them.
+        table = load_split_table(base_dir, split) if args.use_table and not args.fix else None
+        if table is not None:
+            logging.info("Using columnar annotation table for %s split", split)
+        split_stats = analyze_split(
+            images_dir,
+            labels_dir,
+            args.check_images,
+            args.check_annotations,
+            table,
+            jobs=args.jobs,
+            probe_cache=base_dir / PROBE_CACHE_NAME,
+            bbox_totals=bbox_totals,
+            shape_totals=shape_totals,
+            num_classes=len(class_names),
+            fix=args.fix,
+        )
         results["splits"][split] = split_stats
     
     # Overall statistics
@@ -227,7 +996,10 @@ def main() -> int:
         "total_images": total_images,
         "total_annotations": total_annotations,
         "average_annotations_per_image": total_annotations / total_images if total_images > 0 else 0,
+        "bbox_statistics": {key: accumulator.to_dict() for key, accumulator in bbox_totals.items()},
     }
+    if shape_totals is not None:
+        results["summary"]["box_shapes"] = shape_totals.report()
     
     # Save results
     output_path = Path(args.output).expanduser().resolve()
@@ -252,6 +1024,12 @@ def main() -> int:
             logging.warning("  Missing images: %d", len(split_data["issues"]["missing_images"]))
         if split_data["issues"]["missing_labels"]:
             logging.warning("  Missing labels: %d", len(split_data["issues"]["missing_labels"]))
+        if split_data["issues"]["invalid_annotations"]:
+            logging.warning("  Invalid annotations: %d", len(split_data["issues"]["invalid_annotations"]))
+        if split_data["issues"].get("unparseable_lines"):
+            logging.warning("  Unparseable label lines: %d", len(split_data["issues"]["unparseable_lines"]))
+        if split_data["issues"].get("fixed_labels"):
+            logging.warning("  Rewrote label files: %d", len(split_data["issues"]["fixed_labels"]))
     
     logging.info("=" * 80)
     logging.info("Saved analysis to: %s", output_path)
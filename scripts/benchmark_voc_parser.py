@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Micro-benchmark prepare_rdd2022.parse_voc on the RDD2022 XML corpus.
+
+Times each parser backend against the original ``ET.parse`` + ``findtext``
+implementation and checks that every backend returns identical records.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from prepare_rdd2022 import CLASS_TO_ID, XML_BACKENDS, Annotation, lxml_etree, parse_voc, voc_to_yolo
+
+
+def configure_logger(verbose: bool) -> None:
+    level = logging.DEBUG if verbose else logging.INFO
+    logging.basicConfig(
+        level=level,
+        format="[%(asctime)s] %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    project_root = Path(__file__).resolve().parents[1]
+    default_raw = project_root / "data" / "raw" / "RDD2022"
+
+    parser = argparse.ArgumentParser(description="Benchmark VOC XML parser backends.")
+    parser.add_argument("--raw-dir", default=str(default_raw), help="Directory searched recursively for *.xml.")
+    parser.add_argument("--limit", type=int, default=5000, help="Maximum number of XML files to parse (0 = all).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes per backend; the best is reported.")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug logging.")
+    return parser.parse_args(argv)
+
+
+def parse_voc_reference(xml_file: Path) -> Optional[Dict]:
+    """The original tree + findtext parser, kept as the correctness and speed baseline."""
+    root = ET.parse(xml_file).getroot()
+    size = root.find("size")
+    if size is None:
+        return None
+
+    width = int(size.findtext("width", default="0"))
+    height = int(size.findtext("height", default="0"))
+    filename = root.findtext("filename")
+    if not filename:
+        filename = xml_file.stem + ".jpg"
+
+    boxes: List[Annotation] = []
+    for obj in root.findall("object"):
+        label = obj.findtext("name", default="").strip()
+        if label not in CLASS_TO_ID:
+            continue
+        bbox = obj.find("bndbox")
+        if bbox is None:
+            continue
+        coords = {
+            "xmin": int(float(bbox.findtext("xmin", default="0"))),
+            "ymin": int(float(bbox.findtext("ymin", default="0"))),
+            "xmax": int(float(bbox.findtext("xmax", default="0"))),
+            "ymax": int(float(bbox.findtext("ymax", default="0"))),
+            "class_id": CLASS_TO_ID[label],
+        }
+        boxes.append(voc_to_yolo(coords, width, height))
+
+    if not boxes:
+        return None
+
+    return {"filename": filename, "annotations": boxes, "width": width, "height": height}
+
+
+def time_parser(parse: Callable[[Path], Optional[Dict]], xml_files: List[Path], repeat: int) -> tuple[float, List]:
+    best = float("inf")
+    results: List[Optional[Dict]] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [parse(xml_file) for xml_file in xml_files]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    configure_logger(args.verbose)
+    # parse_voc warns about files without a size tag; keep the timing loop quiet.
+    logging.getLogger().setLevel(logging.ERROR if not args.verbose else logging.DEBUG)
+
+    raw_dir = Path(args.raw_dir).expanduser().resolve()
+    xml_files = sorted(raw_dir.rglob("*.xml"))
+    if args.limit:
+        xml_files = xml_files[: args.limit]
+    if not xml_files:
+        logging.error("No XML files found under %s", raw_dir)
+        return 1
+
+    parsers: Dict[str, Callable[[Path], Optional[Dict]]] = {"reference": parse_voc_reference}
+    for backend in XML_BACKENDS:
+        if backend == "lxml" and lxml_etree is None:
+            continue
+        parsers[backend] = lambda xml_file, backend=backend: parse_voc(xml_file, backend)
+
+    timings: Dict[str, float] = {}
+    reference: Optional[List] = None
+    for name, parse in parsers.items():
+        elapsed, results = time_parser(parse, xml_files, args.repeat)
+        timings[name] = elapsed
+        if reference is None:
+            reference = results
+        elif results != reference:
+            logging.error("Backend %s produced different records than the reference parser", name)
+            return 1
+
+    logging.getLogger().setLevel(logging.INFO)
+    logging.info("Parsed %d XML files from %s (best of %d)", len(xml_files), raw_dir, args.repeat)
+    if lxml_etree is None:
+        logging.info("lxml not installed; lxml backend skipped")
+    baseline = timings["reference"]
+    logging.info("%-10s %10s %14s %8s", "parser", "total (s)", "per file (us)", "speedup")
+    for name, elapsed in timings.items():
+        logging.info(
+            "%-10s %10.3f %14.1f %7.2fx",
+            name,
+            elapsed,
+            elapsed / len(xml_files) * 1e6,
+            baseline / elapsed if elapsed > 0 else 0.0,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,8 @@ import numpy as np
 import yaml
 from ultralytics import YOLO
 
+from prepare_rdd2022 import load_split_table
+
 
 def configure_logger(verbose: bool) -> None:
     level = logging.DEBUG if verbose else logging.INFO
@@ -137,9 +139,32 @@ def compute_per_class_metrics(metrics_obj: Any, class_names: List[str]) -> Dict[
 
 
 def analyze_class_distribution(data_yaml: str, split: str) -> Dict[str, Any]:
-    """Analyze class distribution in the dataset."""
+    """Analyze class distribution in the dataset.
+
+    Uses the columnar ``annotations/<split>.npz`` table written by
+    prepare_rdd2022.py when present, falling back to scanning the labels.
+    """
     from ultralytics.data import YOLODataset
     
+    table = load_split_table(Path(data_yaml).parent, split)
+    if table is not None:
+        num_classes = 0
+        try:
+            with open(data_yaml, "r", encoding="utf-8") as f:
+                num_classes = len((yaml.safe_load(f) or {}).get("names") or [])
+        except (OSError, yaml.YAMLError) as e:
+            logging.warning("Could not read class names from %s: %s", data_yaml, e)
+        # Ids beyond the named classes still get counted rather than dropped.
+        counts = np.bincount(table["class_id"].astype(np.int64), minlength=num_classes)
+        total_objects = int(counts.sum())
+        return {
+            "total_images": len(table["image_path"]),
+            "total_objects": total_objects,
+            "per_class": {f"class_{i}": int(counts[i]) for i in range(counts.size)},
+            "class_balance": {f"class_{i}": counts[i] / total_objects if total_objects > 0 else 0
+                            for i in range(counts.size)}
+        }
+
     try:
         dataset = YOLODataset(data_yaml, task="detect", mode=split)
         
@@ -9,12 +9,18 @@ with a progress bar and optionally extracts it into the project's data directory
 from __future__ import annotations
 
 import argparse
+import hashlib
 import logging
+import os
 import sys
-from pathlib import Path
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import IO, Callable, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 import zipfile
 import json
@@ -187,47 +193,533 @@ def download_with_zenodo_get(record_id: str, destination: Path, filename: str) -
         return False
 
 
-def stream_download(url: str, destination: Path) -> None:
-    logging.info("Starting download from %s", url)
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
-    with requests.get(url, stream=True, timeout=60, headers=headers, allow_redirects=True) as response:
+DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+}
+CHUNK_SIZE = 1 << 20
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """Session whose connection pool can keep ``pool_size`` connections to one host alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DOWNLOAD_HEADERS)
+    return session
+
+
+def probe_download(session: requests.Session, url: str) -> Tuple[str, Optional[int], bool, Optional[str]]:
+    """Resolve redirects and return ``(final_url, size, supports_ranges, validator)``.
+
+    The validator (ETag or Last-Modified) is sent as ``If-Range`` on resumed
+    requests, so a changed remote file restarts the download instead of
+    being spliced onto stale bytes.
+    """
+    with session.get(url, stream=True, timeout=60, headers={"Range": "bytes=0-0"}, allow_redirects=True) as response:
+        response.raise_for_status()
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range", "")
+            total = content_range.rpartition("/")[2]
+            return response.url, int(total) if total.isdigit() else None, True, validator
+        length = response.headers.get("Content-Length")
+        return response.url, int(length) if length else None, False, validator
+
+
+def file_sha256(path: Path, chunk_size: int = CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_part_state(part_path: Path) -> Dict:
+    """Read ``<part>.json``: ``total`` and ``validator`` of the partial file, plus ``segments`` if segmented."""
+    state_path = part_path.with_name(part_path.name + ".json")
+    if not (part_path.exists() and state_path.exists()):
+        return {}
+    try:
+        return json.loads(state_path.read_text(encoding="utf-8"))
+    except ValueError:
+        return {}
+
+
+def _save_part_state(part_path: Path, state: Dict) -> None:
+    state_path = part_path.with_name(part_path.name + ".json")
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp_path, state_path)
+
+
+def _download_single(
+    session: requests.Session, url: str, part_path: Path, total: Optional[int], resumable: bool, validator: Optional[str]
+) -> str:
+    """Append to ``part_path`` over one connection, resuming from its current size; returns the SHA-256.
+
+    The validator the partial file was started with is kept in
+    ``<part>.json`` and sent as ``If-Range``, so a changed remote file is
+    served in full and the download restarts from zero.
+    """
+    digest = hashlib.sha256()
+    state = _load_part_state(part_path)
+    if "segments" in state:
+        # A segmented .part is preallocated to full size, so its size says nothing about progress.
+        logging.info("Discarding segmented partial download; restarting over one connection")
+        part_path.unlink()
+        state = {}
+    offset = part_path.stat().st_size if resumable and part_path.exists() else 0
+    if (total is not None and offset > total) or state.get("total") != total:
+        offset = 0
+    resume_validator = state.get("validator")
+    if validator and not resume_validator:
+        # Nothing to check the partial bytes against; do not splice them onto the remote file.
+        offset = 0
+    if offset:
+        # Hash what is already on disk so the digest still covers the whole file.
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    if offset and offset == total and resume_validator == validator:
+        logging.info("Partial download is already complete")
+        return digest.hexdigest()
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    if offset and resume_validator:
+        headers["If-Range"] = resume_validator
+    with session.get(url, stream=True, timeout=60, headers=headers) as response:
         response.raise_for_status()
-        total = int(response.headers.get("Content-Length", 0))
-        destination.parent.mkdir(parents=True, exist_ok=True)
-        with open(destination, "wb") as f, tqdm(
+        if offset and response.status_code != 206:
+            logging.info("Server sent the full file; restarting download from zero")
+            offset = 0
+            digest = hashlib.sha256()
+        elif offset:
+            logging.info("Resuming download at %.1f MB", offset / 1e6)
+        served_validator = response.headers.get("ETag") or response.headers.get("Last-Modified") or validator
+        _save_part_state(part_path, {"total": total, "validator": served_validator})
+        with open(part_path, "ab" if offset else "wb") as f, tqdm(
             total=total,
+            initial=offset,
             unit="B",
             unit_scale=True,
-            desc=f"Downloading {destination.name}",
+            desc=f"Downloading {part_path.name}",
         ) as progress:
-            for chunk in response.iter_content(chunk_size=1 << 20):
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
                 if chunk:
                     f.write(chunk)
+                    digest.update(chunk)
                     progress.update(len(chunk))
-    logging.info("Saved archive to %s", destination)
+    return digest.hexdigest()
 
 
-def extract_archive(archive_path: Path, extract_to: Path, force: bool) -> None:
-    if extract_to.exists():
-        if force:
-            logging.info("Removing existing directory %s", extract_to)
-            for child in extract_to.iterdir():
-                if child.is_file():
-                    child.unlink()
-                else:
-                    import shutil
+def _download_segmented(
+    session: requests.Session,
+    url: str,
+    part_path: Path,
+    total: int,
+    segments: int,
+    validator: Optional[str],
+    on_progress: Optional[Callable[[List[List[int]]], None]] = None,
+) -> str:
+    """Fetch ``segments`` byte ranges concurrently into a preallocated ``part_path``; returns the SHA-256.
+
+    Per-segment progress is saved to ``<part>.json`` so an interrupted run
+    only re-fetches the missing tail of each segment; an existing state file
+    keeps its own segment layout whatever ``segments`` is. ``on_progress`` is
+    called with the ``[start, end, fetched]`` segment list whenever more
+    bytes are on disk.
+    """
+    state = _load_part_state(part_path)
+    if (
+        "segments" not in state
+        or state.get("total") != total
+        or state.get("validator") != validator
+        or part_path.stat().st_size != total
+    ):
+        bounds = [total * i // segments for i in range(segments + 1)]
+        state = {
+            "total": total,
+            "validator": validator,
+            "segments": [[bounds[i], bounds[i + 1], 0] for i in range(segments) if bounds[i] < bounds[i + 1]],
+        }
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+    else:
+        logging.info("Resuming segmented download (%.1f MB already on disk)", sum(seg[2] for seg in state["segments"]) / 1e6)
+
+    lock = threading.Lock()
 
-                    shutil.rmtree(child)
+    def save_state() -> None:
+        _save_part_state(part_path, state)
+
+    save_state()
+    if on_progress is not None:
+        on_progress(state["segments"])
+    done = sum(seg[2] for seg in state["segments"])
+    with tqdm(total=total, initial=done, unit="B", unit_scale=True, desc=f"Downloading {part_path.name}") as progress:
+
+        def fetch(segment: List[int]) -> None:
+            start, end, fetched = segment
+            if start + fetched >= end:
+                return
+            headers = {"Range": f"bytes={start + fetched}-{end - 1}"}
+            if validator:
+                headers["If-Range"] = validator
+            with session.get(url, stream=True, timeout=60, headers=headers) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise IOError(f"Server ignored range request for bytes {start + fetched}-{end - 1}")
+                with open(part_path, "r+b") as f:
+                    f.seek(start + fetched)
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        chunk = chunk[: end - start - segment[2]]
+                        f.write(chunk)
+                        f.flush()  # Bytes reach the file before the state file counts them.
+                        progress.update(len(chunk))
+                        with lock:
+                            segment[2] += len(chunk)
+                            save_state()
+                            if on_progress is not None:
+                                on_progress(state["segments"])
+            if segment[2] != end - start:
+                raise IOError(f"Segment {start}-{end - 1} ended after {segment[2]} of {end - start} bytes")
+
+        with ThreadPoolExecutor(max_workers=len(state["segments"])) as executor:
+            for future in [executor.submit(fetch, segment) for segment in state["segments"]]:
+                future.result()
+
+    # The state file stays until _finish_download moves the .part into place.
+    return file_sha256(part_path)
+
+
+def stream_download(url: str, destination: Path, segments: int = 1, sha256: Optional[str] = None) -> str:
+    """Download ``url`` to ``destination`` through a resumable ``<destination>.part`` file.
+
+    When the server supports HTTP Range requests, an interrupted download
+    resumes where it stopped, and ``segments > 1`` splits the file into that
+    many byte ranges fetched concurrently over a pooled session. The SHA-256
+    of the result is computed while streaming (or in one pass after a
+    segmented download), compared with ``sha256`` when given, and returned.
+    The ``.part`` file only replaces ``destination`` once it is complete and
+    verified.
+    """
+    logging.info("Starting download from %s", url)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    part_path = destination.with_name(destination.name + ".part")
+    segmented_part = "segments" in _load_part_state(part_path)
+    with make_session(segments) as session:
+        final_url, total, resumable, validator = probe_download(session, url)
+        if (segments > 1 or segmented_part) and resumable and total:
+            if segmented_part and segments == 1:
+                logging.info("Continuing the segmented partial download")
+            digest = _download_segmented(session, final_url, part_path, total, segments, validator)
         else:
-            logging.info("Directory %s already exists; skipping extraction", extract_to)
-            return
+            if segments > 1:
+                logging.warning("Server does not support range requests; downloading over one connection")
+            digest = _download_single(session, final_url, part_path, total, resumable, validator)
+
+    _finish_download(part_path, destination, total, digest, sha256)
+    return digest
+
+
+def _finish_download(part_path: Path, destination: Path, total: Optional[int], digest: str, sha256: Optional[str]) -> None:
+    """Check size and digest of a finished ``.part`` file and move it into place."""
+    if total is not None and part_path.stat().st_size != total:
+        raise IOError(f"Downloaded {part_path.stat().st_size} bytes, expected {total}; rerun to resume")
+    if sha256 and digest.lower() != sha256.lower():
+        part_path.unlink()
+        part_path.with_name(part_path.name + ".json").unlink(missing_ok=True)
+        raise ValueError(f"SHA-256 mismatch for {destination.name}: expected {sha256}, got {digest}")
+    os.replace(part_path, destination)
+    part_path.with_name(part_path.name + ".json").unlink(missing_ok=True)
+    logging.info("Saved archive to %s (sha256 %s)", destination, digest)
+
+
+def prepare_extract_dir(extract_to: Path, force: bool) -> None:
+    """Empty ``extract_to`` when forced; otherwise existing members are kept and checked later."""
+    if extract_to.exists() and force:
+        logging.info("Removing existing directory %s", extract_to)
+        for child in extract_to.iterdir():
+            if child.is_file():
+                child.unlink()
+            else:
+                shutil.rmtree(child)
+
+
+def member_extracted(info: zipfile.ZipInfo, extract_to: Path) -> bool:
+    """Whether ``info`` is already on disk at its full size (an interrupted member is shorter)."""
+    target = extract_to / info.filename
+    if info.is_dir():
+        return target.is_dir()
+    try:
+        return target.stat().st_size == info.file_size
+    except OSError:
+        return False
+
+
+def _make_member_dirs(infos: List[zipfile.ZipInfo], extract_to: Path) -> None:
+    # Created up front: zipfile's own makedirs races when members are extracted from several threads.
+    dirs = {str(PurePosixPath(info.filename).parent) for info in infos} | {
+        info.filename.rstrip("/") for info in infos if info.is_dir()
+    }
+    for directory in sorted(dirs):
+        if directory not in ("", ".") and ".." not in PurePosixPath(directory).parts:
+            (extract_to / directory).mkdir(parents=True, exist_ok=True)
 
-    logging.info("Extracting %s to %s", archive_path, extract_to)
+
+def extract_archive(archive_path: Path, extract_to: Path, force: bool, jobs: int = 1) -> None:
+    prepare_extract_dir(extract_to, force)
+    extract_members(archive_path, extract_to, jobs)
+
+
+def extract_members(archive_path: Path, extract_to: Path, jobs: int = 1) -> None:
+    """Extract the members of ``archive_path`` not yet on disk, splitting them over ``jobs`` threads.
+
+    Members already extracted at their full size (checked against the
+    central directory) are skipped, so an interrupted extraction resumes.
+    Each thread owns a ZipFile handle and a contiguous run of members in
+    archive order, so reads stay sequential; zlib releases the GIL while
+    inflating, so threads scale with cores.
+    """
+    start = time.perf_counter()
     with zipfile.ZipFile(archive_path, "r") as zf:
-        zf.extractall(extract_to)
-    logging.info("Extraction complete")
+        listed = zf.infolist()
+    infos = sorted((info for info in listed if not member_extracted(info, extract_to)), key=lambda info: info.header_offset)
+    if not infos:
+        logging.info("All %d members of %s already extracted to %s", len(listed), archive_path.name, extract_to)
+        return
+    logging.info("Extracting %d of %d members of %s to %s", len(infos), len(listed), archive_path, extract_to)
+    if jobs <= 1:
+        with zipfile.ZipFile(archive_path, "r") as zf:
+            for info in infos:
+                zf.extract(info, extract_to)
+    else:
+        _make_member_dirs(infos, extract_to)
+        total = sum(info.compress_size for info in infos) or 1
+        groups: List[List[zipfile.ZipInfo]] = [[] for _ in range(jobs)]
+        acc = 0
+        for info in infos:
+            groups[min(jobs - 1, acc * jobs // total)].append(info)
+            acc += info.compress_size
+
+        def extract_group(group: List[zipfile.ZipInfo]) -> None:
+            with zipfile.ZipFile(archive_path, "r") as zf:
+                for info in group:
+                    zf.extract(info, extract_to)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for future in [executor.submit(extract_group, group) for group in groups if group]:
+                future.result()
+    logging.info("Extraction complete (%d members in %.1fs)", len(infos), time.perf_counter() - start)
+
+
+class _NeedBytes(Exception):
+    def __init__(self, offset: int) -> None:
+        super().__init__(offset)
+        self.offset = offset
+
+
+class _PartialArchive:
+    """Read-only file view of an archive that is still downloading.
+
+    Bytes from ``tail_start`` to the end come from ``tail`` (the fetched
+    central directory); earlier bytes are read from ``part_path``, or raise
+    :class:`_NeedBytes` when no part file is given. This lets ``zipfile``
+    list and extract members before the archive is complete.
+    """
+
+    def __init__(self, part_path: Optional[Path], total: int, tail_start: int, tail: bytes) -> None:
+        # Unbuffered: a read-ahead buffer would keep serving bytes that were
+        # still zeros when it was filled, after the download has written them.
+        self._file: Optional[IO[bytes]] = open(part_path, "rb", buffering=0) if part_path is not None else None
+        self._total = total
+        self._tail_start = tail_start
+        self._tail = tail
+        self._pos = 0
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: self._total}[whence]
+        if base + offset < 0:
+            raise OSError("Negative seek position")
+        self._pos = base + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = self._total if size is None or size < 0 else min(self._total, self._pos + size)
+        data = b""
+        if self._pos < self._tail_start:
+            if self._file is None:
+                raise _NeedBytes(self._pos)
+            self._file.seek(self._pos)
+            want = min(end, self._tail_start) - self._pos
+            data = b""
+            while len(data) < want:
+                block = self._file.read(want - len(data))
+                if not block:
+                    break
+                data += block
+        if end > self._tail_start:
+            data += self._tail[max(self._pos, self._tail_start) - self._tail_start : end - self._tail_start]
+        self._pos += len(data)
+        return data
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+def fetch_central_directory(session: requests.Session, url: str, total: int, validator: Optional[str]) -> Tuple[int, bytes]:
+    """Fetch just enough of the archive's end to parse its central directory; returns ``(start, bytes)``."""
+    start = max(0, total - (1 << 16))
+    while True:
+        headers = {"Range": f"bytes={start}-{total - 1}"}
+        if validator:
+            headers["If-Range"] = validator
+        with session.get(url, timeout=60, headers=headers) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError("Server ignored range request for the central directory")
+            tail = response.content
+        try:
+            zipfile.ZipFile(_PartialArchive(None, total, start, tail)).close()
+            return start, tail
+        except _NeedBytes as e:
+            start = max(0, e.offset - (1 << 12))
+
+
+class ZipStreamExtractor:
+    """Extracts ZIP members while the archive's byte ranges are still arriving.
+
+    Members are queued per download segment in archive order. As a segment's
+    downloaded prefix grows, every member whose bytes are all on disk (its
+    local header up to the next member or the central directory) is handed
+    to a thread pool that inflates it through :class:`_PartialArchive`.
+    Members a previous, interrupted run already extracted are not queued.
+    """
+
+    def __init__(self, part_path: Path, total: int, tail_start: int, tail: bytes, extract_to: Path, jobs: int) -> None:
+        self.part_path = part_path
+        self.total = total
+        self.tail_start = tail_start
+        self.tail = tail
+        self.extract_to = extract_to
+        with zipfile.ZipFile(_PartialArchive(None, total, tail_start, tail)) as zf:
+            infos = sorted(zf.infolist(), key=lambda info: info.header_offset)
+            directory_start = zf.start_dir
+        self.spans = [
+            (info, info.header_offset, infos[i + 1].header_offset if i + 1 < len(infos) else directory_start)
+            for i, info in enumerate(infos)
+            if not member_extracted(info, extract_to)
+        ]
+        self.skipped = len(infos) - len(self.spans)
+        _make_member_dirs(infos, extract_to)
+        self.queues: Optional[List[List[Tuple[zipfile.ZipInfo, int, int]]]] = None
+        self.executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+        self.futures = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def _extract(self, info: zipfile.ZipInfo) -> None:
+        zf = getattr(self.local, "zf", None)
+        if zf is None:
+            zf = self.local.zf = zipfile.ZipFile(_PartialArchive(self.part_path, self.total, self.tail_start, self.tail))
+        zf.extract(info, self.extract_to)
+
+    def on_progress(self, segments: List[List[int]]) -> None:
+        with self.lock:
+            if self.queues is None:
+                self.queues = [[] for _ in segments]
+                for span in reversed(self.spans):
+                    index = next(i for i, (start, end, _) in enumerate(segments) if start <= span[1] < end)
+                    self.queues[index].append(span)
+            for index, queue in enumerate(self.queues):
+                while queue:
+                    _, begin, end = queue[-1]
+                    if not all(
+                        seg_start + fetched >= min(end, seg_end)
+                        for seg_start, seg_end, fetched in segments
+                        if seg_start < end and begin < seg_end
+                    ):
+                        break
+                    info = queue.pop()[0]
+                    self.futures.append(self.executor.submit(self._extract, info))
+
+    def finish(self, complete: bool = True) -> int:
+        """Wait for queued extractions; returns the number of members extracted.
+
+        With ``complete``, extraction errors are raised and every member must
+        have been extracted; otherwise (download failed) this only drains the
+        pool.
+        """
+        try:
+            for future in self.futures:
+                if complete:
+                    future.result()
+                else:
+                    future.exception()
+        finally:
+            self.executor.shutdown(wait=True)
+        pending = sum(len(queue) for queue in self.queues or []) if complete else 0
+        if pending:
+            raise IOError(f"{pending} members were never fully downloaded")
+        return len(self.futures)
+
+
+def download_and_extract(
+    url: str,
+    destination: Path,
+    extract_to: Path,
+    segments: int = 4,
+    sha256: Optional[str] = None,
+    jobs: int = 4,
+) -> str:
+    """Download a ZIP and extract its members as soon as their bytes have arrived.
+
+    The central directory is fetched first with a suffix range request; the
+    archive body then downloads in ``segments`` concurrent ranges while
+    :class:`ZipStreamExtractor` inflates finished members. Servers without
+    range support fall back to :func:`stream_download` followed by a
+    parallel :func:`extract_archive`. Returns the archive's SHA-256.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    part_path = destination.with_name(destination.name + ".part")
+    start = time.perf_counter()
+    with make_session(segments + 1) as session:
+        final_url, total, resumable, validator = probe_download(session, url)
+        if resumable and total:
+            logging.info("Starting download from %s", url)
+            tail_start, tail = fetch_central_directory(session, final_url, total, validator)
+            extract_to.mkdir(parents=True, exist_ok=True)
+            extractor = ZipStreamExtractor(part_path, total, tail_start, tail, extract_to, jobs)
+            logging.info(
+                "Central directory lists %d members (%d already extracted); extracting while downloading",
+                len(extractor.spans) + extractor.skipped,
+                extractor.skipped,
+            )
+            try:
+                digest = _download_segmented(
+                    session, final_url, part_path, total, max(1, segments), validator, on_progress=extractor.on_progress
+                )
+            except BaseException:
+                extractor.finish(complete=False)
+                raise
+            extracted = extractor.finish()
+            logging.info("Extracted %d members by %.1fs", extracted, time.perf_counter() - start)
+            _finish_download(part_path, destination, total, digest, sha256)
+            return digest
+
+    logging.warning("Server does not support range requests; extracting after the download")
+    digest = stream_download(url, destination, segments=segments, sha256=sha256)
+    extract_members(destination, extract_to, jobs)
+    return digest
 
 
 def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
@@ -250,6 +742,24 @@ def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
         action="store_true",
         help="Only download the archive without extracting it.",
     )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Number of concurrent HTTP range requests used for the download.",
+    )
+    parser.add_argument(
+        "--extract-jobs",
+        dest="extract_jobs",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="Threads used to extract archive members (during the download when the server allows ranges).",
+    )
+    parser.add_argument(
+        "--sha256",
+        default=None,
+        help="Expected SHA-256 of the archive; the download fails if it does not match.",
+    )
     parser.add_argument(
         "--force",
         action="store_true",
@@ -271,6 +781,7 @@ def main(argv: Optional[list[str]] = None) -> int:
     archive_path = output_dir / ARCHIVE_NAME
     extract_dir = output_dir / "RDD2022"
 
+    extracted = False
     if archive_path.exists() and not args.force:
         logging.info("Archive already exists at %s; skipping download", archive_path)
     else:
@@ -281,10 +792,24 @@ def main(argv: Optional[list[str]] = None) -> int:
             download_url = get_figshare_download_url()
             logging.info("Using Figshare download URL for RDD2022 dataset")
         
-        stream_download(download_url, archive_path)
+        if not args.skip_extract:
+            # Runs on every attempt: a resumed download re-checks the members
+            # extracted so far and picks up the rest.
+            prepare_extract_dir(extract_dir, args.force)
+            download_and_extract(
+                download_url,
+                archive_path,
+                extract_dir,
+                segments=args.segments,
+                sha256=args.sha256,
+                jobs=args.extract_jobs,
+            )
+        else:
+            stream_download(download_url, archive_path, segments=args.segments, sha256=args.sha256)
+        extracted = True
 
-    if not args.skip_extract:
-        extract_archive(archive_path, extract_dir, args.force)
+    if not args.skip_extract and not extracted:
+        extract_archive(archive_path, extract_dir, args.force, jobs=args.extract_jobs)
 
     logging.info("Dataset setup finished. Raw data located at %s", extract_dir)
     return 0
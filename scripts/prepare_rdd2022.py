@@ -4,21 +4,42 @@ Convert the raw RDD2022 dataset into YOLO-friendly train/val/test splits.
 
 The script expects the dataset extracted with the same folder hierarchy as the
 official release, where each region (e.g., India_Drone, Japan) contains an
-`annotations/xmls` directory and an `images` directory.
+`annotations/xmls` directory and an `images` directory. With `--stream-zips`
+the region archives are read in place instead of being extracted first.
 """
 
 from __future__ import annotations
 
 import argparse
+import errno
+import hashlib
+import io
+import json
 import logging
+import math
+import os
+import platform
 import random
 import shutil
 import sys
+import tarfile
+import threading
+import time
 import xml.etree.ElementTree as ET
 import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence
+from pathlib import Path, PurePosixPath
+from typing import IO, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml is an optional parser backend.
+    lxml_etree = None
 
 CLASS_NAMES = ["D00", "D01", "D10", "D11", "D20", "D40"]
 CLASS_TO_ID: Dict[str, int] = {name: idx for idx, name in enumerate(CLASS_NAMES)}
@@ -33,6 +54,61 @@ class Annotation:
     height: float
 
 
+@dataclass(frozen=True)
+class ZipMember:
+    """A file inside a region ZIP, usable where an extracted ``Path`` would be.
+
+    ``parent``/``name``/``stem`` mirror the path the member would have if the
+    archive were extracted next to itself, so image lookup rules are unchanged.
+    """
+
+    archive: Path
+    member: str
+    size: int = 0
+    mtime_ns: int = 0
+    header_offset: int = 0
+
+    @classmethod
+    def from_info(cls, archive: Path, info: zipfile.ZipInfo) -> "ZipMember":
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        return cls(archive, info.filename, info.file_size, int(mtime * 1e9), info.header_offset)
+
+    @property
+    def path(self) -> Path:
+        return self.archive / self.member
+
+    @property
+    def parent(self) -> Path:
+        return self.path.parent
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def stem(self) -> str:
+        return self.path.stem
+
+    def open(self) -> IO[bytes]:
+        return open_zip(self.archive).open(self.member)
+
+    def __str__(self) -> str:
+        return f"{self.archive}!/{self.member}"
+
+
+ImageSource = Union[Path, ZipMember]
+
+# ZipFile handles reused within a process; reading the central directory per member would dominate.
+_ZIP_HANDLES: Dict[Path, zipfile.ZipFile] = {}
+
+
+def open_zip(archive: Path) -> zipfile.ZipFile:
+    handle = _ZIP_HANDLES.get(archive)
+    if handle is None:
+        handle = _ZIP_HANDLES[archive] = zipfile.ZipFile(archive, "r")
+    return handle
+
+
 def configure_logger(verbose: bool) -> None:
     level = logging.DEBUG if verbose else logging.INFO
     logging.basicConfig(
@@ -42,18 +118,23 @@ def configure_logger(verbose: bool) -> None:
     )
 
 
-def find_image(file_stem: str, search_dir: Path) -> Optional[Path]:
-    """Try to locate the corresponding image file for a VOC annotation."""
-    # Ensure search_dir is absolute
-    search_dir = search_dir.resolve()
-    
-    extensions = [".jpg", ".jpeg", ".png"]
-    
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png"]
+
+
+def image_search_dirs(search_dir: Path, resolve: bool = True) -> List[Path]:
+    """Directories searched for an annotation's image, in priority order.
+
+    With ``resolve=False`` the paths are normalised lexically instead of through
+    ``Path.resolve``, which avoids a syscall per candidate.
+    """
+    if resolve:
+        search_dir = search_dir.resolve()
+
     # Try multiple search strategies based on common RDD2022 directory structures
     # Structure 1: annotations/xmls/ -> images/ (same level as annotations)
     # Structure 2: train/annotations/xmls/ -> train/images/
     # Structure 3: region/train/annotations/xmls/ -> region/train/images/
-    
+
     search_paths = [
         search_dir,  # Same directory as XML
         search_dir / "images",  # images subdirectory
@@ -61,24 +142,30 @@ def find_image(file_stem: str, search_dir: Path) -> Optional[Path]:
         search_dir.parent.parent / "images",  # images at train level
         search_dir.parent.parent.parent / "images",  # images at region level
     ]
-    
+
     # Also try going up to find train/ or similar split directories
     current = search_dir
     for _ in range(4):  # Go up max 4 levels
         if current.name in ["train", "val", "test"]:
             search_paths.append(current / "images")
         current = current.parent
-    
+
     # Remove duplicates while preserving order
     seen = set()
     unique_paths = []
     for path in search_paths:
-        path_resolved = path.resolve()
+        path_resolved = path.resolve() if resolve else Path(os.path.normpath(path))
         if path_resolved not in seen:
             seen.add(path_resolved)
             unique_paths.append(path_resolved)
-    
-    for ext in extensions:
+    return unique_paths
+
+
+def find_image(file_stem: str, search_dir: Path) -> Optional[Path]:
+    """Try to locate the corresponding image file for a VOC annotation."""
+    unique_paths = image_search_dirs(search_dir)
+
+    for ext in IMAGE_EXTENSIONS:
         for search_path in unique_paths:
             candidate = search_path / f"{file_stem}{ext}"
             if candidate.exists():
@@ -87,6 +174,83 @@ def find_image(file_stem: str, search_dir: Path) -> Optional[Path]:
     return None
 
 
+class ImageIndex:
+    """In-memory map of image files, built with a single directory walk.
+
+    Lookups follow the same priority as :func:`find_image` (extension first,
+    then search directory) but are dictionary hits instead of ``exists()``
+    probes. Directories outside the walked tree are listed lazily, once.
+    Extensions are matched case-insensitively (``foo.JPG`` answers a lookup
+    for ``foo.jpg``), as the ``exists()`` probes do on case-insensitive
+    filesystems; an exact lower-case suffix wins when both are present.
+    """
+
+    def __init__(self, lazy: bool = True) -> None:
+        self._dirs: Dict[Path, Dict[str, ImageSource]] = {}
+        self._lazy = lazy
+
+    @staticmethod
+    def _add(entries: Dict[str, ImageSource], name: str, source: ImageSource) -> int:
+        stem, ext = os.path.splitext(name)
+        key = stem + ext.lower()
+        if ext.lower() not in IMAGE_EXTENSIONS or (key in entries and key != name):
+            return 0
+        added = key not in entries
+        entries[key] = source
+        return int(added)
+
+    @classmethod
+    def build(cls, root: Path) -> "ImageIndex":
+        index = cls()
+        root = root.resolve()
+        image_count = 0
+        for dirpath, _, filenames in os.walk(root):
+            entries = index._dirs.setdefault(Path(dirpath), {})
+            for filename in filenames:
+                image_count += index._add(entries, filename, Path(dirpath) / filename)
+        logging.info("Indexed %d images in %d directories under %s", image_count, len(index._dirs), root)
+        return index
+
+    @classmethod
+    def from_zips(cls, members: Iterable[ZipMember]) -> "ImageIndex":
+        """Index image members of region ZIPs; no filesystem directories are consulted."""
+        index = cls(lazy=False)
+        for member in members:
+            index._add(index._dirs.setdefault(member.parent, {}), member.name, member)
+        return index
+
+    def _entries(self, directory: Path) -> Dict[str, ImageSource]:
+        entries = self._dirs.get(directory)
+        if entries is None:
+            entries = {}
+            if not self._lazy:
+                return entries
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        self._add(entries, entry.name, directory / entry.name)
+            except OSError:
+                pass
+            self._dirs[directory] = entries
+        return entries
+
+    def matches(self, file_stem: str, search_dir: Path) -> List[ImageSource]:
+        """Return every candidate image for ``file_stem``, best match first."""
+        search_dirs = image_search_dirs(search_dir, resolve=False)
+        found: List[ImageSource] = []
+        for ext in IMAGE_EXTENSIONS:
+            name = f"{file_stem}{ext}"
+            for directory in search_dirs:
+                candidate = self._entries(directory).get(name)
+                if candidate is not None:
+                    found.append(candidate)
+        return found
+
+    def lookup(self, file_stem: str, search_dir: Path) -> Optional[ImageSource]:
+        found = self.matches(file_stem, search_dir)
+        return found[0] if found else None
+
+
 def voc_to_yolo(box: Dict[str, int], img_w: int, img_h: int) -> Annotation:
     x_min, y_min, x_max, y_max = box["xmin"], box["ymin"], box["xmax"], box["ymax"]
     x_center = ((x_min + x_max) / 2.0) / img_w
@@ -102,36 +266,95 @@ def voc_to_yolo(box: Dict[str, int], img_w: int, img_h: int) -> Annotation:
     )
 
 
-def parse_voc(xml_file: Path) -> Optional[Dict]:
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    size = root.find("size")
+XML_BACKENDS = ["etree", "lxml"]
+
+# Shared lxml parser: no entity expansion or network access, and comments dropped
+# so element text matches what xml.etree reports.
+_LXML_PARSER = (
+    lxml_etree.XMLParser(resolve_entities=False, no_network=True, remove_comments=True, remove_pis=True)
+    if lxml_etree is not None
+    else None
+)
+
+BNDBOX_TAGS = ("xmin", "ymin", "xmax", "ymax")
+
+
+def _first_child_texts(elem, tags: Sequence[str]) -> Dict[str, str]:
+    """Text of the first child with each tag, like ``findtext`` but in one pass."""
+    texts: Dict[str, str] = {}
+    for child in elem:
+        tag = child.tag
+        if tag in tags and tag not in texts:
+            texts[tag] = child.text or ""
+    return texts
+
+
+def parse_voc(xml_file: Union[Path, ZipMember], backend: str = "etree") -> Optional[Dict]:
+    """Parse a VOC annotation into YOLO boxes.
+
+    The file is read in one call, parsed from memory and walked once per level
+    instead of issuing a ``findtext`` per field. ``backend="lxml"`` parses with
+    lxml instead; on RDD2022-sized files its per-element proxies cancel out the
+    faster parse (see scripts/benchmark_voc_parser.py), so it is opt-in.
+    """
+    if isinstance(xml_file, ZipMember):
+        with xml_file.open() as f:
+            data = f.read()
+    else:
+        with open(xml_file, "rb") as f:
+            data = f.read()
+    if backend == "lxml":
+        if lxml_etree is None:
+            raise ValueError("XML backend 'lxml' requested but lxml is not installed (pip install lxml)")
+        root = lxml_etree.fromstring(data, _LXML_PARSER)
+    else:
+        root = ET.fromstring(data)
+
+    size = None
+    filename = None
+    objects = []
+    for child in root:
+        tag = child.tag
+        if tag == "object":
+            objects.append(child)
+        elif tag == "size":
+            if size is None:
+                size = child
+        elif tag == "filename":
+            if filename is None:
+                filename = child.text or ""
+
     if size is None:
         logging.warning("Missing size tag in %s", xml_file)
         return None
 
-    width = int(size.findtext("width", default="0"))
-    height = int(size.findtext("height", default="0"))
-    filename = root.findtext("filename")
+    size_texts = _first_child_texts(size, ("width", "height"))
+    width = int(size_texts.get("width", "0"))
+    height = int(size_texts.get("height", "0"))
     if not filename:
         filename = xml_file.stem + ".jpg"
 
     boxes: List[Annotation] = []
-    for obj in root.findall("object"):
-        label = obj.findtext("name", default="").strip()
+    for obj in objects:
+        label = None
+        bbox = None
+        for child in obj:
+            tag = child.tag
+            if tag == "name":
+                if label is None:
+                    label = (child.text or "").strip()
+            elif tag == "bndbox":
+                if bbox is None:
+                    bbox = child
+        label = label or ""
         if label not in CLASS_TO_ID:
             logging.debug("Skipping unknown class %s in %s", label, xml_file)
             continue
-        bbox = obj.find("bndbox")
         if bbox is None:
             continue
-        coords = {
-            "xmin": int(float(bbox.findtext("xmin", default="0"))),
-            "ymin": int(float(bbox.findtext("ymin", default="0"))),
-            "xmax": int(float(bbox.findtext("xmax", default="0"))),
-            "ymax": int(float(bbox.findtext("ymax", default="0"))),
-            "class_id": CLASS_TO_ID[label],
-        }
+        bbox_texts = _first_child_texts(bbox, BNDBOX_TAGS)
+        coords = {key: int(float(bbox_texts.get(key, "0"))) for key in BNDBOX_TAGS}
+        coords["class_id"] = CLASS_TO_ID[label]
         boxes.append(voc_to_yolo(coords, width, height))
 
     if not boxes:
@@ -140,16 +363,8 @@ def parse_voc(xml_file: Path) -> Optional[Dict]:
     return {"filename": filename, "annotations": boxes, "width": width, "height": height}
 
 
-def extract_region_zips(raw_dir: Path, force: bool = False) -> Path:
-    """Extract region ZIP files if they exist."""
-    extracted_dir = raw_dir / "extracted"
-    
-    # Check if already extracted
-    if extracted_dir.exists() and not force:
-        logging.info("Region ZIPs already extracted to %s", extracted_dir)
-        return extracted_dir
-    
-    # Find all ZIP files in the raw directory
+def find_region_zips(raw_dir: Path) -> List[Path]:
+    """Find all region ZIP files in the raw directory."""
     zip_files = list(raw_dir.rglob("*.zip"))
     if not zip_files:
         # Check if there's a nested RDD2022 directory
@@ -158,100 +373,1494 @@ def extract_region_zips(raw_dir: Path, force: bool = False) -> Path:
             zip_files = list(nested_dir.glob("*.zip"))
             if zip_files:
                 logging.info("Found %d region ZIP files in nested directory", len(zip_files))
-    
+    return sorted(zip_files)
+
+
+EXTRACT_STATE_DIR = ".extract-state"
+
+
+def file_crc32(path: Path, chunk_size: int = 1 << 20) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def make_member_dirs(infos: List[zipfile.ZipInfo], extracted_dir: Path) -> None:
+    # Region archives share top-level folders and are extracted by parallel
+    # processes; zipfile's own makedirs races on them (FileExistsError).
+    dirs = {str(PurePosixPath(info.filename).parent) for info in infos}
+    for directory in sorted(dirs):
+        if directory not in ("", ".") and ".." not in PurePosixPath(directory).parts:
+            (extracted_dir / directory).mkdir(parents=True, exist_ok=True)
+
+
+def extract_region_zip(zip_file: Path, extracted_dir: Path, force: bool = False, verify_all: bool = False) -> Dict:
+    """Extract one region ZIP, skipping members already present on disk.
+
+    Members whose extracted file is missing or has the wrong size are
+    (re-)extracted; zipfile checks their CRC while reading them, so they are
+    not read back. A state file recording the member list lets later runs
+    skip a fully extracted archive with a ``stat`` per member.
+    ``verify_all`` CRC-checks the members already present from an earlier
+    run. A corrupt member is recorded and skipped, so the rest of the
+    archive is still extracted; the state file is only written without
+    errors.
+    """
+    state_path = extracted_dir / EXTRACT_STATE_DIR / f"{zip_file.name}.json"
+    st = zip_file.stat()
+    summary = {"archive": zip_file.name, "extracted": 0, "skipped": 0, "errors": []}
+
+    def extract(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> bool:
+        try:
+            zf.extract(info, extracted_dir)
+        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+            summary["errors"].append(f"{info.filename}: {e}")
+            target = extracted_dir / info.filename
+            if target.exists():
+                target.unlink()
+            return False
+        summary["extracted"] += 1
+        return True
+
+    try:
+        with zipfile.ZipFile(zip_file, "r") as zf:
+            infos = [info for info in zf.infolist() if not info.is_dir()]
+            member_list = [[info.filename, info.file_size, info.CRC] for info in infos]
+            state = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "members": member_list}
+            if not force and not verify_all and state_path.exists():
+                try:
+                    recorded = json.loads(state_path.read_text(encoding="utf-8"))
+                except ValueError:
+                    recorded = None
+                if recorded == state and all(
+                    (extracted_dir / name).is_file() and (extracted_dir / name).stat().st_size == size
+                    for name, size, _ in member_list
+                ):
+                    summary["skipped"] = len(infos)
+                    return summary
+
+            pending = []
+            to_verify = []
+            for info in infos:
+                target = extracted_dir / info.filename
+                if not force and target.is_file() and target.stat().st_size == info.file_size:
+                    summary["skipped"] += 1
+                    if verify_all:
+                        to_verify.append(info)
+                    continue
+                pending.append(info)
+            make_member_dirs(pending, extracted_dir)
+            # Header-offset order reads the archive sequentially.
+            for info in sorted(pending, key=lambda i: i.header_offset):
+                extract(zf, info)
+
+            # Files from an earlier run that fail their CRC get one fresh extraction.
+            for info in to_verify:
+                if file_crc32(extracted_dir / info.filename) != info.CRC:
+                    summary["skipped"] -= 1
+                    extract(zf, info)
+    except (OSError, zipfile.BadZipFile) as e:
+        summary["errors"].append(str(e))
+        return summary
+
+    if not summary["errors"]:
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        state_path.write_text(json.dumps(state), encoding="utf-8")
+    return summary
+
+
+def extract_region_zips(raw_dir: Path, force: bool = False, jobs: int = 1, verify_all: bool = False) -> Path:
+    """Extract region ZIP files if they exist, one archive per worker.
+
+    Raises ``RuntimeError`` once every archive has been processed if any
+    member could not be extracted.
+    """
+    extracted_dir = raw_dir / "extracted"
+
+    zip_files = find_region_zips(raw_dir)
     if not zip_files:
+        if extracted_dir.exists():
+            logging.info("Region ZIPs already extracted to %s", extracted_dir)
+            return extracted_dir
         logging.warning("No ZIP files found. Assuming dataset is already extracted.")
         return raw_dir
     
     extracted_dir.mkdir(parents=True, exist_ok=True)
     logging.info("Extracting %d region ZIP files to %s", len(zip_files), extracted_dir)
-    
-    for zip_file in zip_files:
-        logging.info("Extracting %s", zip_file.name)
-        try:
-            with zipfile.ZipFile(zip_file, "r") as zf:
-                zf.extractall(extracted_dir)
-        except Exception as e:
-            logging.error("Failed to extract %s: %s", zip_file, e)
-            continue
+
+    workers = max(1, min(jobs, len(zip_files)))
+    failed: Dict[str, List[str]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(extract_region_zip, zip_file, extracted_dir, force, verify_all)
+            for zip_file in zip_files
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            summary = future.result()
+            if summary["errors"]:
+                failed[summary["archive"]] = summary["errors"]
+                for error in summary["errors"][:5]:
+                    logging.error("Failed to extract %s: %s", summary["archive"], error)
+                if len(summary["errors"]) > 5:
+                    logging.error("... and %d more in %s", len(summary["errors"]) - 5, summary["archive"])
+                continue
+            logging.info(
+                "[%d/%d] %s: extracted %d members, %d already up to date",
+                done,
+                len(zip_files),
+                summary["archive"],
+                summary["extracted"],
+                summary["skipped"],
+            )
+    if failed:
+        raise RuntimeError(
+            f"{sum(len(errors) for errors in failed.values())} members failed to extract from "
+            f"{', '.join(sorted(failed))}; the other members are in place, rerun to retry"
+        )
     
     logging.info("Extraction complete. Looking for annotations in %s", extracted_dir)
     return extracted_dir
 
 
-def collect_annotations(annotation_dir: Path) -> List[Dict]:
-    # Ensure annotation_dir is absolute
-    annotation_dir = annotation_dir.resolve()
-    xml_files = sorted(annotation_dir.rglob("*.xml"))
-    logging.info("Found %d annotation files under %s", len(xml_files), annotation_dir)
-    samples: List[Dict] = []
-    missing_count = 0
+# Image index shared with worker processes through the pool initializer, so it is
+# pickled once per worker rather than once per chunk.
+_WORKER_INDEX: Optional[ImageIndex] = None
+_WORKER_XML_BACKEND = "etree"
+
+
+def _init_worker(image_index: Optional[ImageIndex], xml_backend: str = "etree") -> None:
+    global _WORKER_INDEX, _WORKER_XML_BACKEND
+    _WORKER_INDEX = image_index
+    _WORKER_XML_BACKEND = xml_backend
+    # Forked workers inherit the parent's ZipFile handles, whose file offsets
+    # are shared with it; reopen archives per process instead.
+    _ZIP_HANDLES.clear()
+
+
+def _resolve_chunk_worker(xml_files: Sequence[ImageSource]) -> List[Tuple[ImageSource, Optional[Dict], List[ImageSource]]]:
+    return resolve_chunk(xml_files, _WORKER_INDEX, _WORKER_XML_BACKEND)
+
+
+def resolve_chunk(
+    xml_files: Sequence[ImageSource],
+    image_index: Optional[ImageIndex] = None,
+    xml_backend: str = "etree",
+) -> List[Tuple[ImageSource, Optional[Dict], List[ImageSource]]]:
+    """Parse a chunk of VOC files and locate their images.
+
+    Returns one ``(xml_file, parsed, image_matches)`` tuple per input file, in
+    input order, so results from worker processes can be stitched back together.
+    ``image_matches`` lists every candidate image, best match first.
+    """
+    results: List[Tuple[ImageSource, Optional[Dict], List[ImageSource]]] = []
     for xml_file in xml_files:
-        # Ensure xml_file is absolute
-        xml_file = xml_file.resolve()
-        parsed = parse_voc(xml_file)
+        parsed = parse_voc(xml_file, xml_backend)
         if not parsed:
+            results.append((xml_file, None, []))
             continue
         file_stem = Path(parsed["filename"]).stem
-        image_path = find_image(file_stem, xml_file.parent)
+        if image_index is not None:
+            matches = image_index.matches(file_stem, xml_file.parent)
+        else:
+            image_path = find_image(file_stem, xml_file.parent)
+            matches = [image_path] if image_path else []
+        results.append((xml_file, parsed, matches))
+    return results
+
+
+# Directory names of the RDD2022 layout that sit between a region folder and its files.
+LAYOUT_DIR_NAMES = {"annotations", "xmls", "images", "labels", "train", "val", "test"}
+
+
+def sample_region(xml_file: ImageSource) -> str:
+    """Region (country) of an annotation: the nearest ancestor outside the split/annotation layout."""
+    parents = PurePosixPath(xml_file.member).parents if isinstance(xml_file, ZipMember) else xml_file.parents
+    for parent in parents:
+        if parent.name and parent.name not in LAYOUT_DIR_NAMES:
+            return parent.name
+    return xml_file.archive.stem if isinstance(xml_file, ZipMember) else ""
+
+
+def resolve_samples(
+    xml_files: Sequence[ImageSource],
+    image_index: Optional[ImageIndex],
+    jobs: int = 1,
+    xml_backend: str = "etree",
+) -> List[Dict]:
+    """Parse ``xml_files`` and pair each with its image, preserving input order."""
+    if jobs > 1 and len(xml_files) > 1:
+        # Several chunks per worker keeps the pool busy when some regions parse slower.
+        chunk_size = max(1, math.ceil(len(xml_files) / (jobs * 8)))
+        chunks = [xml_files[i:i + chunk_size] for i in range(0, len(xml_files), chunk_size)]
+        logging.info("Parsing annotations with %d workers (%d chunks)", jobs, len(chunks))
+        resolved: List[Tuple[ImageSource, Optional[Dict], List[ImageSource]]] = []
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_worker, initargs=(image_index, xml_backend)
+        ) as executor:
+            # executor.map yields in submission order, keeping the sample list identical to a serial run.
+            for chunk_result in executor.map(_resolve_chunk_worker, chunks):
+                resolved.extend(chunk_result)
+    else:
+        resolved = resolve_chunk(xml_files, image_index, xml_backend)
+
+    samples: List[Dict] = []
+    missing_count = 0
+    ambiguous_count = 0
+    for xml_file, parsed, matches in resolved:
+        if not parsed:
+            continue
+        if len(matches) > 1:
+            ambiguous_count += 1
+            if ambiguous_count <= 5:
+                logging.warning(
+                    "Ambiguous image for %s: using %s, also found %s",
+                    xml_file,
+                    matches[0],
+                    ", ".join(str(m) for m in matches[1:]),
+                )
+            elif ambiguous_count == 6:
+                logging.warning("... (suppressing further ambiguous image warnings)")
+        image_path = matches[0] if matches else None
         if not image_path:
             missing_count += 1
             if missing_count <= 5:  # Only log first few for debugging
+                file_stem = Path(parsed["filename"]).stem
                 logging.warning("Image for %s not found (stem: %s); skipping", xml_file, file_stem)
             elif missing_count == 6:
                 logging.warning("... (suppressing further missing image warnings)")
             continue
-        samples.append({"image": image_path, "annotations": parsed["annotations"]})
+        samples.append(
+            {
+                "image": image_path,
+                "annotations": parsed["annotations"],
+                "width": parsed["width"],
+                "height": parsed["height"],
+                "region": sample_region(xml_file),
+            }
+        )
     if missing_count > 0:
         logging.warning("Total missing images: %d out of %d XML files", missing_count, len(xml_files))
+    if ambiguous_count > 0:
+        logging.warning("Total ambiguous image stems: %d out of %d XML files", ambiguous_count, len(xml_files))
     logging.info("Collected %d samples with bounding boxes", len(samples))
     return samples
 
 
+def collect_annotations(
+    annotation_dir: Path,
+    jobs: int = 1,
+    use_index: bool = True,
+    xml_backend: str = "etree",
+) -> List[Dict]:
+    # Ensure annotation_dir is absolute
+    annotation_dir = annotation_dir.resolve()
+    xml_files = [xml_file.resolve() for xml_file in sorted(annotation_dir.rglob("*.xml"))]
+    logging.info("Found %d annotation files under %s", len(xml_files), annotation_dir)
+    image_index = ImageIndex.build(annotation_dir) if use_index else None
+    return resolve_samples(xml_files, image_index, jobs, xml_backend)
+
+
+def collect_zip_annotations(zip_files: Sequence[Path], jobs: int = 1, xml_backend: str = "etree") -> List[Dict]:
+    """Collect samples straight from region ZIPs without extracting them.
+
+    XML members are ordered by their in-archive path, which matches the order
+    :func:`collect_annotations` sees after extraction, so seeded splits agree.
+    """
+    members: List[ZipMember] = []
+    for zip_file in zip_files:
+        zip_file = zip_file.resolve()
+        try:
+            infos = open_zip(zip_file).infolist()
+        except (OSError, zipfile.BadZipFile) as e:
+            logging.error("Failed to read %s: %s", zip_file, e)
+            continue
+        members.extend(ZipMember.from_info(zip_file, info) for info in infos if not info.is_dir())
+
+    xml_files = sorted(
+        (m for m in members if m.member.lower().endswith(".xml")),
+        key=lambda m: (PurePosixPath(m.member), m.archive),
+    )
+    logging.info("Found %d annotation members in %d ZIP files", len(xml_files), len(zip_files))
+    return resolve_samples(xml_files, ImageIndex.from_zips(members), jobs, xml_backend)
+
+
+DEDUP_MODES = ["off", "group", "drop"]
+DEDUP_CACHE_NAME = "dedup_hashes.json"
+
+
+def image_dhash(source: ImageSource) -> Optional[int]:
+    """64-bit difference hash of an image, or ``None`` if it cannot be decoded.
+
+    JPEGs are decoded at reduced resolution via ``draft``, which makes hashing
+    far cheaper than a full decode.
+    """
+    try:
+        with (source.open() if isinstance(source, ZipMember) else open(source, "rb")) as f:
+            img = Image.open(f)
+            img.draft("L", (64, 64))
+            pixels = np.asarray(img.convert("L").resize((9, 8), Image.BOX), dtype=np.int16)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        logging.debug("Could not hash %s: %s", source, e)
+        return None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _hash_chunk(sources: Sequence[ImageSource]) -> List[Optional[int]]:
+    return [image_dhash(source) for source in sources]
+
+
+def compute_image_hashes(samples: Sequence[Dict], jobs: int = 1, cache_path: Optional[Path] = None) -> List[Optional[int]]:
+    """Perceptual hash of every sample image, reusing a (source, size, mtime) keyed cache."""
+    cache: Dict[str, List] = {}
+    if cache_path is not None and cache_path.exists():
+        try:
+            cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        except ValueError:
+            cache = {}
+
+    keys: List[Tuple[str, int, int]] = []
+    for sample in samples:
+        source = sample["image"]
+        if isinstance(source, ZipMember):
+            keys.append((str(source), source.size, source.mtime_ns))
+        else:
+            st = source.stat()
+            keys.append((str(source), st.st_size, st.st_mtime_ns))
+
+    hashes: List[Optional[int]] = [None] * len(samples)
+    todo: List[int] = []
+    for i, (key, size, mtime_ns) in enumerate(keys):
+        cached = cache.get(key)
+        if cached and cached[0] == size and cached[1] == mtime_ns:
+            hashes[i] = cached[2]
+        else:
+            todo.append(i)
+    logging.info("Hashing %d images (%d cached)", len(todo), len(samples) - len(todo))
+
+    sources = [samples[i]["image"] for i in todo]
+    if jobs > 1 and len(sources) > 1:
+        chunk_size = max(1, math.ceil(len(sources) / (jobs * 8)))
+        chunks = [sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size)]
+        computed: List[Optional[int]] = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(None,)) as executor:
+            for chunk_result in executor.map(_hash_chunk, chunks):
+                computed.extend(chunk_result)
+    else:
+        computed = _hash_chunk(sources)
+    for i, value in zip(todo, computed):
+        hashes[i] = value
+
+    if cache_path is not None:
+        cache = {key: [size, mtime_ns, value] for (key, size, mtime_ns), value in zip(keys, hashes)}
+        cache_path.write_text(json.dumps(cache), encoding="utf-8")
+    failed = sum(1 for value in hashes if value is None)
+    if failed:
+        logging.warning("Could not hash %d images; they are treated as unique", failed)
+    return hashes
+
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8).reshape(*values.shape, 8)].sum(axis=-1)
+
+
+def group_near_duplicates(hashes: Sequence[Optional[int]], threshold: int) -> List[int]:
+    """Group images whose hashes differ in at most ``threshold`` bits.
+
+    Uses multi-index hashing: the 64-bit hash is cut into ``threshold + 1``
+    non-empty substrings, and any two hashes within ``threshold`` bits agree
+    exactly on at least one of them; that needs ``threshold < 64``. Only
+    images sharing a substring bucket are compared (vectorized), and matches
+    are merged with union-find, so near-duplicate chains such as consecutive
+    dashcam frames end up in one group.
+
+    Returns a group id per input; ungrouped images get their own id.
+    """
+    if not 0 <= threshold < 64:
+        raise ValueError(f"Hamming threshold must be in [0, 63] for 64-bit hashes, got {threshold}")
+    parent = list(range(len(hashes)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    valid = np.array([i for i, value in enumerate(hashes) if value is not None], dtype=np.int64)
+    values = np.array([hashes[i] for i in valid], dtype=np.uint64)
+    pieces = threshold + 1
+    # Near-equal widths, so every one of the threshold + 1 pieces gets at least one bit.
+    bounds = [piece * 64 // pieces for piece in range(pieces + 1)]
+    pair_count = 0
+    for shift, end in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << (end - shift)) - 1)
+        keys = (values >> np.uint64(shift)) & mask
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2:
+                continue
+            bucket_values = values[bucket]
+            rows = max(1, (1 << 22) // len(bucket))  # bound the distance block to ~4M entries
+            for start in range(0, len(bucket), rows):
+                block = bucket_values[start:start + rows]
+                distances = _popcount64(block[:, None] ^ bucket_values[None, :])
+                for a, b in zip(*np.nonzero(distances <= threshold)):
+                    a += start
+                    if a < b:
+                        root_a, root_b = find(int(valid[bucket[a]])), find(int(valid[bucket[b]]))
+                        if root_a != root_b:
+                            parent[root_b] = root_a
+                            pair_count += 1
+
+    group_ids = [find(i) for i in range(len(hashes))]
+    sizes: Dict[int, int] = {}
+    for group_id in group_ids:
+        sizes[group_id] = sizes.get(group_id, 0) + 1
+    grouped = [size for size in sizes.values() if size > 1]
+    logging.info(
+        "Found %d near-duplicate groups covering %d images (largest %d, %d matching pairs merged)",
+        len(grouped),
+        sum(grouped),
+        max(grouped, default=0),
+        pair_count,
+    )
+    return group_ids
+
+
+def drop_near_duplicates(samples: Sequence[Dict], group_ids: Sequence[int]) -> List[Dict]:
+    """Keep one sample per near-duplicate group: the one with the most boxes, first on ties."""
+    keep: Dict[int, int] = {}
+    for i, group_id in enumerate(group_ids):
+        best = keep.get(group_id)
+        if best is None or len(samples[i]["annotations"]) > len(samples[best]["annotations"]):
+            keep[group_id] = i
+    kept = sorted(keep.values())
+    logging.info("Dropped %d near-duplicate images", len(samples) - len(kept))
+    return [samples[i] for i in kept]
+
+
+SPLIT_NAMES = ["train", "val", "test"]
+SPLIT_STRATEGIES = ["random", "stratified"]
+
+
+def stratified_assignment(
+    sample_labels: Sequence[Dict[int, int]],
+    ratios: Sequence[float],
+    rng: random.Random,
+    sizes: Optional[Sequence[int]] = None,
+) -> List[int]:
+    """Iterative stratification (Sechidis et al., 2011) over weighted labels.
+
+    ``sample_labels[i]`` maps label id -> weight (e.g. box count) for sample
+    ``i``. Labels are handled rarest first; each sample carrying the current
+    label goes to the split that still needs the most of that label, breaking
+    ties by the split's overall remaining capacity and then at random. Runs in
+    O(samples x labels-per-sample). ``sizes`` weighs each entry's share of the
+    split capacity when entries are groups of images.
+    """
+    n = len(sample_labels)
+    sizes = sizes or [1] * n
+    desired_total = [sum(sizes) * ratio for ratio in ratios]
+    desired: Dict[int, List[float]] = {}
+    members: Dict[int, List[int]] = {}
+    remaining: Dict[int, int] = {}
+    for i, labels in enumerate(sample_labels):
+        for label, weight in labels.items():
+            if label not in desired:
+                desired[label] = [0.0] * len(ratios)
+                members[label] = []
+                remaining[label] = 0
+            for j, ratio in enumerate(ratios):
+                desired[label][j] += weight * ratio
+            members[label].append(i)
+            remaining[label] += 1
+
+    assignment = [-1] * n
+    split_ids = list(range(len(ratios)))
+
+    def assign(i: int, j: int) -> None:
+        assignment[i] = j
+        desired_total[j] -= sizes[i]
+        for label, weight in sample_labels[i].items():
+            desired[label][j] -= weight
+            remaining[label] -= 1
+
+    while True:
+        pending = [label for label, count in remaining.items() if count > 0]
+        if not pending:
+            break
+        label = min(pending, key=lambda l: (remaining[l], l))
+        for i in members[label]:
+            if assignment[i] != -1:
+                continue
+            need = desired[label]
+            best = max(split_ids, key=lambda j: (need[j], desired_total[j]))
+            ties = [j for j in split_ids if need[j] == need[best] and desired_total[j] == desired_total[best]]
+            assign(i, best if len(ties) == 1 else rng.choice(ties))
+
+    for i in range(n):
+        if assignment[i] == -1:
+            best = max(split_ids, key=lambda j: desired_total[j])
+            assignment[i] = best
+            desired_total[best] -= sizes[i]
+    return assignment
+
+
 def split_dataset(
     samples: Sequence[Dict],
     train_ratio: float,
     val_ratio: float,
     seed: int,
+    strategy: str = "random",
+    group_ids: Optional[Sequence[int]] = None,
 ) -> Dict[str, List[Dict]]:
+    """Split samples into train/val/test.
+
+    ``random`` shuffles with ``seed`` and slices. ``stratified`` balances every
+    split on region and on per-class box counts with
+    :func:`stratified_assignment`, so rare classes reach val/test too. With
+    ``group_ids`` (one per sample), samples sharing an id always land in the
+    same split.
+    """
     if train_ratio + val_ratio >= 1.0:
         raise ValueError("train_ratio + val_ratio must be < 1.0 to leave room for test split.")
+    if strategy not in SPLIT_STRATEGIES:
+        raise ValueError(f"Unknown split strategy {strategy!r}; expected one of {SPLIT_STRATEGIES}")
+
+    if group_ids is None:
+        units = [[sample] for sample in samples]
+    else:
+        by_group: Dict[int, List[Dict]] = {}
+        for sample, group_id in zip(samples, group_ids):
+            by_group.setdefault(group_id, []).append(sample)
+        units = list(by_group.values())
+    rng = random.Random(seed)
+    rng.shuffle(units)
 
-    samples = list(samples)
-    random.Random(seed).shuffle(samples)
+    if strategy == "stratified":
+        regions = sorted({sample.get("region", "") for sample in samples})
+        region_label = {region: len(CLASS_NAMES) + k for k, region in enumerate(regions)}
+        unit_labels: List[Dict[int, int]] = []
+        for unit in units:
+            labels: Dict[int, int] = {}
+            for sample in unit:
+                region = region_label[sample.get("region", "")]
+                labels[region] = labels.get(region, 0) + 1
+                for ann in sample["annotations"]:
+                    labels[ann.class_id] = labels.get(ann.class_id, 0) + 1
+            unit_labels.append(labels)
+        ratios = [train_ratio, val_ratio, 1.0 - train_ratio - val_ratio]
+        assignment = stratified_assignment(unit_labels, ratios, rng, sizes=[len(unit) for unit in units])
+        splits: Dict[str, List[Dict]] = {name: [] for name in SPLIT_NAMES}
+        for unit, split_id in zip(units, assignment):
+            splits[SPLIT_NAMES[split_id]].extend(unit)
+        return splits
 
-    total = len(samples)
+    total = sum(len(unit) for unit in units)
     train_end = int(total * train_ratio)
     val_end = train_end + int(total * val_ratio)
 
-    return {
-        "train": samples[:train_end],
-        "val": samples[train_end:val_end],
-        "test": samples[val_end:],
-    }
+    # Fill splits unit by unit; with singleton units this is the plain shuffled slice.
+    splits = {name: [] for name in SPLIT_NAMES}
+    filled = 0
+    for unit in units:
+        split_name = "train" if filled < train_end else "val" if filled < val_end else "test"
+        splits[split_name].extend(unit)
+        filled += len(unit)
+    return splits
+
+
+def log_split_balance(splits: Dict[str, Sequence[Dict]]) -> None:
+    """Log per-split box counts per class, so starved classes are visible before training."""
+    for split_name, records in splits.items():
+        counts = [0] * len(CLASS_NAMES)
+        for record in records:
+            for ann in record["annotations"]:
+                counts[ann.class_id] += 1
+        logging.info(
+            "%s class boxes: %s",
+            split_name,
+            ", ".join(f"{name}={count}" for name, count in zip(CLASS_NAMES, counts)),
+        )
+
+
+LINK_MODES = ["copy", "hardlink", "symlink", "reflink", "auto"]
+
+# Order tried by --link-mode auto: copy-on-write clone, then a shared inode, then bytes.
+AUTO_LINK_ORDER = ["reflink", "hardlink", "copy"]
+
+# Linux FICLONE ioctl request number (_IOW(0x94, 9, int)).
+_FICLONE = 0x40049409
+
+
+def reflink_file(src: Path, dst: Path) -> None:
+    """Create a copy-on-write clone of ``src`` at ``dst``.
+
+    Uses the FICLONE ioctl on Linux (btrfs, XFS) and clonefile(2) on macOS
+    (APFS). Raises ``OSError`` when the filesystem cannot clone.
+    """
+    system = platform.system()
+    if system == "Linux":
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                dst.unlink()
+                raise
+    elif system == "Darwin":
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(dst))
+    else:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform", str(dst))
+
+
+class ImageLinker:
+    """Materialize source images into the output tree with a configurable strategy.
+
+    In ``auto`` mode each strategy in :data:`AUTO_LINK_ORDER` is tried in turn;
+    a strategy that fails (e.g. hardlinks across filesystems) is disabled for
+    the rest of the run so the fallback cost is paid once, not per image.
+    """
+
+    def __init__(self, mode: str = "copy") -> None:
+        if mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {mode!r}; expected one of {LINK_MODES}")
+        self.mode = mode
+        self._candidates = list(AUTO_LINK_ORDER) if mode == "auto" else [mode]
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    @staticmethod
+    def _materialize(method: str, src: Path, dst: Path) -> None:
+        if method == "copy":
+            shutil.copy2(src, dst)
+        elif method == "hardlink":
+            os.link(src, dst)
+        elif method == "symlink":
+            os.symlink(src, dst)
+        else:
+            reflink_file(src, dst)
+
+    def __call__(self, src: Path, dst: Path) -> str:
+        if dst.is_symlink() or dst.exists():
+            dst.unlink()
+        while True:
+            with self._lock:
+                candidates = list(self._candidates)
+            method = candidates[0]
+            try:
+                self._materialize(method, src, dst)
+            except OSError as e:
+                if self.mode != "auto" or len(candidates) == 1:
+                    raise
+                with self._lock:
+                    if self._candidates and self._candidates[0] == method:
+                        self._candidates.pop(0)
+                        logging.info("Link mode %s unavailable (%s); falling back to %s", method, e, self._candidates[0])
+                continue
+            with self._lock:
+                self.counts[method] = self.counts.get(method, 0) + 1
+            return method
 
 
-def write_split(split_name: str, records: Iterable[Dict], target_dir: Path) -> None:
-    image_dir = target_dir / "images" / split_name
-    label_dir = target_dir / "labels" / split_name
-    image_dir.mkdir(parents=True, exist_ok=True)
-    label_dir.mkdir(parents=True, exist_ok=True)
+def format_label(annotations: Iterable[Annotation]) -> str:
+    return "".join(
+        f"{ann.class_id} {ann.x_center:.6f} {ann.y_center:.6f} {ann.width:.6f} {ann.height:.6f}\n"
+        for ann in annotations
+    )
+
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(target_dir: Path) -> Dict[str, Dict]:
+    """Load the per-image manifest from a previous run, keyed by output image path."""
+    manifest_path = target_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable manifest %s: %s", manifest_path, e)
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        logging.info("Manifest version changed; rebuilding all outputs")
+        return {}
+    return manifest.get("entries", {})
+
+
+def save_manifest(target_dir: Path, entries: Dict[str, Dict]) -> None:
+    manifest_path = target_dir / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "entries": entries}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    logging.info("Saved manifest with %d entries to %s", len(entries), manifest_path)
+
+
+def remove_stale_outputs(target_dir: Path, previous: Dict[str, Dict], current: Dict[str, Dict]) -> int:
+    """Delete images and labels recorded in ``previous`` that the current run no longer produces.
 
-    for record in records:
+    Labels are named by image stem, so an image whose extension changed
+    (``x.JPG`` -> ``x.jpg``) keeps its label; on a case-insensitive
+    filesystem the old image path is the new image too, and is kept as well.
+    """
+
+    def label_key(key: str, split: str) -> str:
+        return f"labels/{split}/{PurePosixPath(key).stem}.txt"
+
+    current_labels = {label_key(key, entry["split"]) for key, entry in current.items()}
+    current_folded = {key.casefold(): key for key in current}
+    removed = 0
+    for key in previous.keys() - current.keys():
+        image_path = target_dir / key
+        paths = []
+        same = current_folded.get(key.casefold())
+        if not (same and image_path.exists() and os.path.samefile(image_path, target_dir / same)):
+            paths.append(image_path)
+        label = label_key(key, previous[key]["split"])
+        if label not in current_labels:
+            paths.append(target_dir / label)
+        for path in paths:
+            if path.is_symlink() or path.exists():
+                path.unlink()
+        removed += 1
+    if removed:
+        logging.info("Removed %d stale outputs", removed)
+    return removed
+
+
+def extract_member(zf: zipfile.ZipFile, member: ZipMember, dst: Path, chunk_size: int = 1 << 20) -> str:
+    """Stream one ZIP member to ``dst`` and return the SHA-256 of its bytes."""
+    if dst.is_symlink() or dst.exists():
+        dst.unlink()
+    digest = hashlib.sha256()
+    with zf.open(member.member) as src, open(dst, "wb") as out:
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    mtime = member.mtime_ns / 1e9
+    os.utime(dst, (mtime, mtime))
+    return digest.hexdigest()
+
+
+def write_splits(
+    splits: Dict[str, Sequence[Dict]],
+    target_dir: Path,
+    linker: Optional[ImageLinker] = None,
+    jobs: int = 1,
+    previous: Optional[Dict[str, Dict]] = None,
+) -> Dict[str, Dict]:
+    """Write all splits and return their manifest entries.
+
+    Outputs whose source content, split assignment, link mode and label digest
+    match ``previous`` are left untouched. Source files are only re-hashed when
+    their size or mtime changed. Records backed by ZIP members are streamed out
+    of their archive in a single in-order pass per archive.
+    """
+    for split_name in splits:
+        (target_dir / "images" / split_name).mkdir(parents=True, exist_ok=True)
+        (target_dir / "labels" / split_name).mkdir(parents=True, exist_ok=True)
+    linker = linker or ImageLinker("copy")
+    previous = previous or {}
+    by_source = {entry["source"]: entry for entry in previous.values()}
+
+    def write_record(split_name: str, record: Dict, zf: Optional[zipfile.ZipFile] = None) -> Tuple[str, Dict, bool, bool]:
         src_image = record["image"]
-        dst_image = image_dir / src_image.name
-        shutil.copy2(src_image, dst_image)
+        dst_image = target_dir / "images" / split_name / src_image.name
+        label_path = target_dir / "labels" / split_name / f"{src_image.stem}.txt"
+        key = dst_image.relative_to(target_dir).as_posix()
 
-        label_path = label_dir / f"{src_image.stem}.txt"
-        with open(label_path, "w", encoding="utf-8") as f:
-            for ann in record["annotations"]:
-                f.write(
-                    f"{ann.class_id} {ann.x_center:.6f} {ann.y_center:.6f} "
-                    f"{ann.width:.6f} {ann.height:.6f}\n"
-                )
+        if isinstance(src_image, ZipMember):
+            size, mtime_ns, link_mode = src_image.size, src_image.mtime_ns, "copy"
+        else:
+            st = src_image.stat()
+            size, mtime_ns, link_mode = st.st_size, st.st_mtime_ns, linker.mode
+        known = by_source.get(str(src_image))
+        if known and known["size"] == size and known["mtime_ns"] == mtime_ns:
+            content_hash = known["sha256"]
+        elif isinstance(src_image, ZipMember):
+            content_hash = None  # Hashed while streaming out of the archive below.
+        else:
+            content_hash = file_digest(src_image)
+        label_text = format_label(record["annotations"])
+        entry = {
+            "source": str(src_image),
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": content_hash,
+            "split": split_name,
+            "link_mode": link_mode,
+            "label_digest": hashlib.sha256(label_text.encode("utf-8")).hexdigest(),
+        }
+
+        prev = previous.get(key)
+        image_current = (
+            prev is not None
+            and content_hash is not None
+            and all(prev.get(field) == entry[field] for field in ("source", "sha256", "split", "link_mode"))
+            and os.path.lexists(dst_image)
+        )
+        if not image_current:
+            if zf is not None:
+                entry["sha256"] = extract_member(zf, src_image, dst_image)
+            else:
+                linker(src_image, dst_image)
+        label_current = prev is not None and prev.get("label_digest") == entry["label_digest"] and label_path.exists()
+        if not label_current:
+            # One formatted buffer and one write per label file.
+            label_path.write_text(label_text, encoding="utf-8")
+        return key, entry, not image_current, not label_current
+
+    def write_archive(archive: Path, items: List[Tuple[str, Dict]]) -> List[Tuple[str, Tuple[str, Dict, bool, bool]]]:
+        # Own handle per task: ZipFile reads from one shared file position.
+        items = sorted(items, key=lambda item: item[1]["image"].header_offset)
+        with zipfile.ZipFile(archive, "r") as zf:
+            return [(split_name, write_record(split_name, record, zf)) for split_name, record in items]
+
+    file_items: List[Tuple[str, Dict]] = []
+    zip_items: Dict[Path, List[Tuple[str, Dict]]] = {}
+    for split_name, records in splits.items():
+        for record in records:
+            if isinstance(record["image"], ZipMember):
+                zip_items.setdefault(record["image"].archive, []).append((split_name, record))
+            else:
+                file_items.append((split_name, record))
+
+    results: List[Tuple[str, Tuple[str, Dict, bool, bool]]] = []
+    if jobs > 1:
+        # Linking and small writes are syscall-bound, so threads overlap them well.
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            archive_futures = [executor.submit(write_archive, archive, items) for archive, items in zip_items.items()]
+            results.extend(executor.map(lambda item: (item[0], write_record(*item)), file_items))
+            for future in archive_futures:
+                results.extend(future.result())
+    else:
+        results.extend((split_name, write_record(split_name, record)) for split_name, record in file_items)
+        for archive, items in zip_items.items():
+            results.extend(write_archive(archive, items))
+
+    entries: Dict[str, Dict] = {}
+    for split_name in splits:
+        split_results = [result for name, result in results if name == split_name]
+        images_written = sum(1 for _, _, image_written, _ in split_results if image_written)
+        labels_written = sum(1 for _, _, _, label_written in split_results if label_written)
+        logging.info(
+            "%s: wrote %d images and %d labels (%d unchanged)",
+            split_name,
+            images_written,
+            labels_written,
+            len(split_results) - max(images_written, labels_written),
+        )
+        entries.update((key, entry) for key, entry, _, _ in split_results)
+    return entries
+
+
+def write_split(
+    split_name: str,
+    records: Iterable[Dict],
+    target_dir: Path,
+    linker: Optional[ImageLinker] = None,
+    jobs: int = 1,
+    previous: Optional[Dict[str, Dict]] = None,
+) -> Dict[str, Dict]:
+    """Write one split and return its manifest entries; see :func:`write_splits`."""
+    return write_splits({split_name: list(records)}, target_dir, linker=linker, jobs=jobs, previous=previous)
+
+
+TABLE_DIR = "annotations"
+
+
+def label_fingerprint(label_dir: Path) -> np.ndarray:
+    """``[file count, newest mtime_ns]`` of the ``.txt`` labels in ``label_dir``.
+
+    Editing a label in place leaves the directory mtime alone but not the
+    file's, and adding or removing one changes the count.
+    """
+    count = 0
+    newest = 0
+    if label_dir.is_dir():
+        with os.scandir(label_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    count += 1
+                    newest = max(newest, entry.stat().st_mtime_ns)
+    return np.array([count, newest], dtype=np.int64)
+
+
+def write_split_table(split_name: str, records: Sequence[Dict], target_dir: Path) -> Path:
+    """Write all boxes of a split to one columnar ``annotations/<split>.npz`` file.
+
+    Per-image columns (``image_path``, ``image_width``, ``image_height``) are
+    indexed by ``image_id``; per-box columns (``image_id``, ``class_id`` and the
+    normalized ``x_center``/``y_center``/``width``/``height``) hold one row per
+    box. Box values are rounded to the six decimals of the ``.txt`` labels so
+    both sources yield the same floats.
+    """
+    image_paths = [f"images/{split_name}/{record['image'].name}" for record in records]
+    boxes = [
+        (image_id, ann.class_id, ann.x_center, ann.y_center, ann.width, ann.height)
+        for image_id, record in enumerate(records)
+        for ann in record["annotations"]
+    ]
+    box_array = np.array(boxes, dtype=np.float64).reshape(-1, 6)
+    coords = np.round(box_array[:, 2:], 6)
+
+    table_dir = target_dir / TABLE_DIR
+    table_dir.mkdir(parents=True, exist_ok=True)
+    table_path = table_dir / f"{split_name}.npz"
+    tmp_path = table_dir / f".{split_name}.tmp.npz"
+    np.savez(
+        tmp_path,
+        image_path=np.array(image_paths, dtype=str),
+        image_width=np.array([record.get("width", 0) for record in records], dtype=np.int32),
+        image_height=np.array([record.get("height", 0) for record in records], dtype=np.int32),
+        image_id=box_array[:, 0].astype(np.int32),
+        class_id=box_array[:, 1].astype(np.int16),
+        x_center=coords[:, 0],
+        y_center=coords[:, 1],
+        width=coords[:, 2],
+        height=coords[:, 3],
+        label_fingerprint=label_fingerprint(target_dir / "labels" / split_name),
+    )
+    os.replace(tmp_path, table_path)
+    logging.info("Saved %s annotation table (%d images, %d boxes) to %s", split_name, len(records), len(boxes), table_path)
+    return table_path
+
+
+def load_split_table(dataset_root: Path, split_name: str) -> Optional[Dict[str, np.ndarray]]:
+    """Load the columnar annotations of a split written by :func:`write_split_table`.
+
+    Returns ``None`` when the table is missing or its stored
+    :func:`label_fingerprint` no longer matches the split's labels (labels
+    were added, removed or edited after preparation), so callers can fall
+    back to reading the ``.txt`` labels.
+    """
+    table_path = dataset_root / TABLE_DIR / f"{split_name}.npz"
+    label_dir = dataset_root / "labels" / split_name
+    if not table_path.exists():
+        return None
+    with np.load(table_path) as data:
+        table = {key: data[key] for key in data.files}
+    stored = table.pop("label_fingerprint", None)
+    if stored is None or not np.array_equal(stored, label_fingerprint(label_dir)):
+        logging.info("Annotation table %s does not match the labels in %s; ignoring it", table_path, label_dir)
+        return None
+    return table
+
+
+CACHE_INDEX_NAME = "scales.json"
+EXIF_ORIENTATION = 0x0112
+
+
+def image_cache_dir(dataset_root: Path, imgsz: int) -> Path:
+    return dataset_root / f"cache_{imgsz}"
+
+
+def resize_image(src: Path, dst: Path, imgsz: int) -> Dict:
+    """Write ``src`` to ``dst`` with its long side shrunk to ``imgsz``.
+
+    EXIF orientation is applied first, matching how the training dataloader
+    decodes images. Images already within ``imgsz`` are copied unchanged.
+    Returns the oriented source size, the scale factor and the cached size.
+    """
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    with Image.open(src) as img:
+        rotated = img.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8)
+        width, height = img.size[::-1] if rotated else img.size
+        scale = min(1.0, imgsz / max(width, height))
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if scale >= 1.0:
+            shutil.copyfile(src, tmp)
+        else:
+            img_format = img.format
+            # JPEG DCT scaling decodes at the nearest power-of-two size above the target.
+            img.draft("RGB", size[::-1] if rotated else size)
+            resized = ImageOps.exif_transpose(img).resize(size, Image.LANCZOS, reducing_gap=2.0)
+            if img_format == "JPEG":
+                resized.convert("RGB").save(tmp, format="JPEG", quality=95)
+            else:
+                resized.save(tmp, format=img_format)
+    os.replace(tmp, dst)
+    return {"width": width, "height": height, "scale": scale, "cached_width": size[0], "cached_height": size[1]}
+
+
+def _resize_chunk(tasks: Sequence[Tuple[Path, Path, int]]) -> List[Optional[Dict]]:
+    results: List[Optional[Dict]] = []
+    for src, dst, imgsz in tasks:
+        try:
+            results.append(resize_image(src, dst, imgsz))
+        except (OSError, ValueError) as e:
+            logging.warning("Could not cache %s: %s", src, e)
+            results.append(None)
+    return results
+
+
+def write_image_cache(splits: Dict[str, Sequence[Dict]], target_dir: Path, imgsz: int, jobs: int = 1) -> Path:
+    """Mirror the prepared splits under ``cache_<imgsz>/`` with images resized to ``imgsz``.
+
+    Images are shrunk on the long side so the dataloader decodes far fewer
+    pixels; YOLO labels are normalized and are copied as-is. Source size,
+    scale factor and cached size of every image are recorded in
+    ``cache_<imgsz>/scales.json``, which also lets reruns skip images whose
+    prepared source is unchanged.
+    """
+    cache_root = image_cache_dir(target_dir, imgsz)
+    index_path = cache_root / CACHE_INDEX_NAME
+    previous: Dict[str, Dict] = {}
+    if index_path.exists():
+        try:
+            data = json.loads(index_path.read_text(encoding="utf-8"))
+            if data.get("imgsz") == imgsz:
+                previous = data.get("images", {})
+        except ValueError:
+            logging.warning("Ignoring unreadable cache index %s", index_path)
+
+    entries: Dict[str, Dict] = {}
+    tasks: List[Tuple[str, Path, Path, int, int]] = []
+    for split_name, records in splits.items():
+        (cache_root / "images" / split_name).mkdir(parents=True, exist_ok=True)
+        (cache_root / "labels" / split_name).mkdir(parents=True, exist_ok=True)
+        for record in records:
+            name = record["image"].name
+            key = f"{split_name}/{name}"
+            src = target_dir / "images" / split_name / name
+            dst = cache_root / "images" / split_name / name
+            st = src.stat()
+            prev = previous.get(key)
+            if prev and prev["source_size"] == st.st_size and prev["source_mtime_ns"] == st.st_mtime_ns and dst.exists():
+                entries[key] = prev
+            else:
+                tasks.append((key, src, dst, st.st_size, st.st_mtime_ns))
+
+            label_src = target_dir / "labels" / split_name / f"{record['image'].stem}.txt"
+            label_dst = cache_root / "labels" / split_name / label_src.name
+            if not label_dst.exists() or label_dst.stat().st_mtime_ns != label_src.stat().st_mtime_ns:
+                shutil.copy2(label_src, label_dst)
+
+    jobs_args = [(src, dst, imgsz) for _, src, dst, _, _ in tasks]
+    if jobs > 1 and len(jobs_args) > 1:
+        chunk_size = max(1, math.ceil(len(jobs_args) / (jobs * 8)))
+        chunks = [jobs_args[i:i + chunk_size] for i in range(0, len(jobs_args), chunk_size)]
+        results: List[Optional[Dict]] = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for chunk_result in executor.map(_resize_chunk, chunks):
+                results.extend(chunk_result)
+    else:
+        results = _resize_chunk(jobs_args)
+
+    for (key, _, _, size, mtime_ns), result in zip(tasks, results):
+        if result is not None:
+            entries[key] = {"source_size": size, "source_mtime_ns": mtime_ns, **result}
+
+    for key in set(previous) - set(entries):
+        split_name, name = key.split("/", 1)
+        (cache_root / "images" / split_name / name).unlink(missing_ok=True)
+        (cache_root / "labels" / split_name / f"{Path(name).stem}.txt").unlink(missing_ok=True)
+
+    tmp_path = index_path.with_name(f".{CACHE_INDEX_NAME}.tmp")
+    tmp_path.write_text(json.dumps({"imgsz": imgsz, "images": entries}, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, index_path)
+    scales = [entry["scale"] for entry in entries.values()]
+    logging.info(
+        "Image cache at %s: resized %d images (%d unchanged), mean scale %.3f",
+        cache_root,
+        len(tasks),
+        len(entries) - len(tasks),
+        sum(scales) / len(scales) if scales else 1.0,
+    )
+    return cache_root
+
+
+TILE_INDEX_NAME = "tiles.json"
+
+
+def tile_dir(dataset_root: Path, tile_size: int) -> Path:
+    return dataset_root / f"tiles_{tile_size}"
+
+
+def tile_starts(length: int, tile_size: int, overlap: float) -> List[int]:
+    """Tile origins along one axis: evenly strided, with the last tile flush to the edge."""
+    if length <= tile_size:
+        return [0]
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def tile_annotations(
+    annotations: Sequence[Annotation],
+    img_w: int,
+    img_h: int,
+    x0: int,
+    y0: int,
+    tile_w: int,
+    tile_h: int,
+    min_visibility: float,
+) -> Tuple[List[Annotation], int]:
+    """Clip boxes to a tile and re-normalize them to the tile size.
+
+    Boxes keeping less than ``min_visibility`` of their area inside the tile
+    are dropped. Returns the kept boxes and the number of boxes dropped after
+    being cut by the tile edge (boxes entirely outside the tile are not counted).
+    """
+    kept: List[Annotation] = []
+    dropped = 0
+    for ann in annotations:
+        bw, bh = ann.width * img_w, ann.height * img_h
+        left, top = ann.x_center * img_w - bw / 2, ann.y_center * img_h - bh / 2
+        cx1, cy1 = max(left, x0), max(top, y0)
+        cx2, cy2 = min(left + bw, x0 + tile_w), min(top + bh, y0 + tile_h)
+        if cx2 <= cx1 or cy2 <= cy1:
+            continue
+        if bw * bh <= 0 or (cx2 - cx1) * (cy2 - cy1) / (bw * bh) < min_visibility:
+            dropped += 1
+            continue
+        kept.append(
+            Annotation(
+                class_id=ann.class_id,
+                x_center=((cx1 + cx2) / 2 - x0) / tile_w,
+                y_center=((cy1 + cy2) / 2 - y0) / tile_h,
+                width=(cx2 - cx1) / tile_w,
+                height=(cy2 - cy1) / tile_h,
+            )
+        )
+    return kept, dropped
+
+
+def tile_image(
+    src: Path,
+    image_dir: Path,
+    label_dir: Path,
+    annotations: Sequence[Annotation],
+    tile_size: int,
+    overlap: float,
+    min_visibility: float,
+    keep_empty: bool,
+) -> Dict:
+    """Cut one image into overlapping tiles and write tile images and labels.
 
+    Returns ``tiles`` as ``[name, x0, y0, width, height]`` rows so predictions
+    can be mapped back onto the source image, plus box counts.
+    """
+    tiles: List[List] = []
+    boxes = dropped = 0
+    with Image.open(src) as img:
+        img_format = img.format
+        img_w, img_h = img.size
+        img.load()
+        for y0 in tile_starts(img_h, tile_size, overlap):
+            for x0 in tile_starts(img_w, tile_size, overlap):
+                tile_w, tile_h = min(tile_size, img_w), min(tile_size, img_h)
+                kept, cut = tile_annotations(annotations, img_w, img_h, x0, y0, tile_w, tile_h, min_visibility)
+                dropped += cut
+                if not kept and not keep_empty:
+                    continue
+                name = f"{src.stem}_{x0}_{y0}{src.suffix}"
+                crop = img.crop((x0, y0, x0 + tile_w, y0 + tile_h))
+                if img_format == "JPEG":
+                    crop.convert("RGB").save(image_dir / name, format="JPEG", quality=95)
+                else:
+                    crop.save(image_dir / name, format=img_format)
+                (label_dir / f"{Path(name).stem}.txt").write_text(format_label(kept), encoding="utf-8")
+                tiles.append([name, x0, y0, tile_w, tile_h])
+                boxes += len(kept)
+    return {"tiles": tiles, "boxes": boxes, "dropped": dropped}
+
+
+def _tile_chunk(tasks: Sequence[Tuple]) -> List[Optional[Dict]]:
+    results: List[Optional[Dict]] = []
+    for task in tasks:
+        try:
+            results.append(tile_image(*task))
+        except (OSError, ValueError) as e:
+            logging.warning("Could not tile %s: %s", task[0], e)
+            results.append(None)
+    return results
+
+
+def write_tiles(
+    splits: Dict[str, Sequence[Dict]],
+    target_dir: Path,
+    tile_size: int,
+    overlap: float = 0.2,
+    min_visibility: float = 0.5,
+    jobs: int = 1,
+) -> Path:
+    """Write an overlapping-tile version of the prepared splits under ``tiles_<size>/``.
+
+    Train keeps only tiles that contain boxes; val and test keep every tile so
+    evaluation still sees background. ``tiles_<size>/tiles.json`` maps each
+    source image to its tiles and lets reruns skip images whose prepared
+    image and labels are unchanged.
+    """
+    root = tile_dir(target_dir, tile_size)
+    index_path = root / TILE_INDEX_NAME
+    params = {"tile_size": tile_size, "overlap": overlap, "min_visibility": min_visibility}
+    previous: Dict[str, Dict] = {}
+    if index_path.exists():
+        try:
+            data = json.loads(index_path.read_text(encoding="utf-8"))
+            if data.get("params") == params:
+                previous = data.get("images", {})
+        except ValueError:
+            logging.warning("Ignoring unreadable tile index %s", index_path)
+
+    entries: Dict[str, Dict] = {}
+    tasks: List[Tuple] = []
+    task_keys: List[Tuple[str, Dict]] = []
+    for split_name, records in splits.items():
+        image_dir = root / "images" / split_name
+        label_dir = root / "labels" / split_name
+        image_dir.mkdir(parents=True, exist_ok=True)
+        label_dir.mkdir(parents=True, exist_ok=True)
+        for record in records:
+            name = record["image"].name
+            key = f"{split_name}/{name}"
+            src = target_dir / "images" / split_name / name
+            st = src.stat()
+            stamp = {
+                "source_size": st.st_size,
+                "source_mtime_ns": st.st_mtime_ns,
+                "label_digest": hashlib.sha256(format_label(record["annotations"]).encode("utf-8")).hexdigest(),
+            }
+            prev = previous.get(key)
+            if prev and all(prev.get(field) == value for field, value in stamp.items()):
+                entries[key] = prev
+                continue
+            if prev:
+                for tile in prev["tiles"]:
+                    (image_dir / tile[0]).unlink(missing_ok=True)
+                    (label_dir / f"{Path(tile[0]).stem}.txt").unlink(missing_ok=True)
+            keep_empty = split_name != "train"
+            tasks.append((src, image_dir, label_dir, record["annotations"], tile_size, overlap, min_visibility, keep_empty))
+            task_keys.append((key, stamp))
+
+    if jobs > 1 and len(tasks) > 1:
+        chunk_size = max(1, math.ceil(len(tasks) / (jobs * 8)))
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+        results: List[Optional[Dict]] = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for chunk_result in executor.map(_tile_chunk, chunks):
+                results.extend(chunk_result)
+    else:
+        results = _tile_chunk(tasks)
+    for (key, stamp), result in zip(task_keys, results):
+        if result is not None:
+            entries[key] = {**stamp, **result}
+
+    for key in set(previous) - set(entries):
+        split_name = key.split("/", 1)[0]
+        for tile in previous[key]["tiles"]:
+            (root / "images" / split_name / tile[0]).unlink(missing_ok=True)
+            (root / "labels" / split_name / f"{Path(tile[0]).stem}.txt").unlink(missing_ok=True)
+
+    tmp_path = index_path.with_name(f".{TILE_INDEX_NAME}.tmp")
+    tmp_path.write_text(json.dumps({"params": params, "images": entries}, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, index_path)
+    for split_name in splits:
+        split_entries = [entry for key, entry in entries.items() if key.startswith(f"{split_name}/")]
+        logging.info(
+            "%s tiles: %d tiles with %d boxes from %d images (%d cut boxes dropped)",
+            split_name,
+            sum(len(entry["tiles"]) for entry in split_entries),
+            sum(entry["boxes"] for entry in split_entries),
+            len(split_entries),
+            sum(entry["dropped"] for entry in split_entries),
+        )
+    logging.info("Tiled %d images (%d unchanged) into %s", len(tasks), len(entries) - len(tasks), root)
+    return root
+
+
+SHARD_DIR = "shards"
+SHARD_INDEX_NAME = "index.json"
+STAGED_STAMP_NAME = ".staged.json"
+
+
+def _shard_tarinfo(name: str, size: int) -> tarfile.TarInfo:
+    # Fixed metadata keeps shards byte-identical across reruns and machines.
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = 0o644
+    info.mtime = 0
+    return info
+
+
+def write_shards(
+    splits: Dict[str, Sequence[Dict]],
+    target_dir: Path,
+    manifest: Dict[str, Dict],
+    shard_bytes: int = 1 << 30,
+) -> Path:
+    """Pack each prepared split into WebDataset-style tar shards under ``shards/<split>/``.
+
+    Every sample is an adjacent ``<stem>.<ext>`` image and ``<stem>.txt``
+    label pair, in split order, and a new shard starts once ``shard_bytes``
+    is reached. ``shards/<split>/index.json`` lists the shards with each
+    member's data offset and size, so single samples can be read with one
+    seek. A split is only repacked when its manifest entries changed.
+    """
+    root = target_dir / SHARD_DIR
+    for split_name, records in splits.items():
+        split_dir = root / split_name
+        split_dir.mkdir(parents=True, exist_ok=True)
+        keys = [f"images/{split_name}/{record['image'].name}" for record in records]
+        digest = hashlib.sha256()
+        for key in keys:
+            entry = manifest.get(key, {})
+            digest.update(f"{key}\0{entry.get('sha256')}\0{entry.get('label_digest')}\n".encode("utf-8"))
+        content_digest = digest.hexdigest()
 
-def write_data_yaml(target_dir: Path, dataset_root: Path) -> None:
+        index_path = split_dir / SHARD_INDEX_NAME
+        if index_path.exists():
+            try:
+                index = json.loads(index_path.read_text(encoding="utf-8"))
+                if index.get("content_digest") == content_digest and all(
+                    (split_dir / shard["name"]).exists() for shard in index["shards"]
+                ):
+                    logging.info("%s shards unchanged (%d shards)", split_name, len(index["shards"]))
+                    continue
+            except (ValueError, KeyError):
+                pass
+
+        shards: List[Dict] = []
+        tar: Optional[tarfile.TarFile] = None
+
+        def close_shard() -> None:
+            tar.close()
+            shard_path = split_dir / shards[-1]["name"]
+            shards[-1]["bytes"] = shard_path.stat().st_size
+            with tarfile.open(shard_path, "r:") as reader:
+                shards[-1]["members"] = [[info.name, info.offset_data, info.size] for info in reader]
+
+        for record in records:
+            image_path = target_dir / "images" / split_name / record["image"].name
+            label_path = target_dir / "labels" / split_name / f"{record['image'].stem}.txt"
+            if tar is None or tar.offset >= shard_bytes:
+                if tar is not None:
+                    close_shard()
+                shards.append({"name": f"{split_name}-{len(shards):06d}.tar", "samples": 0})
+                tar = tarfile.open(split_dir / shards[-1]["name"], "w", format=tarfile.USTAR_FORMAT)
+            with open(image_path, "rb") as f:
+                tar.addfile(_shard_tarinfo(image_path.name, image_path.stat().st_size), f)
+            label_bytes = label_path.read_bytes()
+            tar.addfile(_shard_tarinfo(label_path.name, len(label_bytes)), io.BytesIO(label_bytes))
+            shards[-1]["samples"] += 1
+        if tar is not None:
+            close_shard()
+
+        live = {shard["name"] for shard in shards}
+        for stale in split_dir.glob(f"{split_name}-*.tar"):
+            if stale.name not in live:
+                stale.unlink()
+        tmp_path = split_dir / f".{SHARD_INDEX_NAME}.tmp"
+        tmp_path.write_text(
+            json.dumps({"split": split_name, "content_digest": content_digest, "samples": len(records), "shards": shards}),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, index_path)
+        logging.info(
+            "%s: packed %d samples into %d shards (%.1f MB)",
+            split_name,
+            len(records),
+            len(shards),
+            sum(shard["bytes"] for shard in shards) / 1e6,
+        )
+    return root
+
+
+def iter_shard(shard_path: Path) -> Iterable[Tuple[str, Dict[str, bytes]]]:
+    """Yield ``(stem, {extension: bytes})`` samples from one shard in a single sequential pass."""
+    key: Optional[str] = None
+    sample: Dict[str, bytes] = {}
+    with tarfile.open(shard_path, "r|") as tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            stem, _, ext = info.name.rpartition(".")
+            if stem != key and sample:
+                yield key, sample
+                sample = {}
+            key = stem
+            sample[ext] = tar.extractfile(info).read()
+    if sample:
+        yield key, sample
+
+
+def _unpack_shard(shard_path: Path, image_dir: Path, label_dir: Path) -> int:
+    count = 0
+    for stem, sample in iter_shard(shard_path):
+        for ext, data in sample.items():
+            (label_dir if ext == "txt" else image_dir).joinpath(f"{stem}.{ext}").write_bytes(data)
+        count += 1
+    return count
+
+
+def stage_shards(shard_root: Path, stage_dir: Path, jobs: int = 4) -> Path:
+    """Unpack sharded splits into a local YOLO tree and return its data YAML.
+
+    Shards are streamed front to back (one reader per shard), which suits
+    network storage far better than opening many small files. Staging is
+    skipped when ``stage_dir`` already holds the same shard contents.
+    """
+    indexes = {}
+    for index_path in sorted(shard_root.glob(f"*/{SHARD_INDEX_NAME}")):
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+        indexes[index["split"]] = index
+    if not indexes:
+        raise FileNotFoundError(f"No shard indexes found under {shard_root}")
+    stamp = {split_name: index["content_digest"] for split_name, index in indexes.items()}
+    stamp_path = stage_dir / STAGED_STAMP_NAME
+    data_yaml = stage_dir / "rdd2022.yaml"
+    if stamp_path.exists() and data_yaml.exists() and json.loads(stamp_path.read_text(encoding="utf-8")) == stamp:
+        logging.info("Using staged shards in %s", stage_dir)
+        return data_yaml
+
+    tasks = []
+    for split_name, index in indexes.items():
+        image_dir = stage_dir / "images" / split_name
+        label_dir = stage_dir / "labels" / split_name
+        shutil.rmtree(image_dir, ignore_errors=True)
+        shutil.rmtree(label_dir, ignore_errors=True)
+        image_dir.mkdir(parents=True)
+        label_dir.mkdir(parents=True)
+        tasks.extend((shard_root / split_name / shard["name"], image_dir, label_dir) for shard in index["shards"])
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        total = sum(executor.map(lambda task: _unpack_shard(*task), tasks))
+    logging.info("Staged %d samples from %d shards in %.1fs", total, len(tasks), time.perf_counter() - start)
+    write_data_yaml(stage_dir, stage_dir)
+    stamp_path.write_text(json.dumps(stamp), encoding="utf-8")
+    return data_yaml
+
+
+def write_data_yaml(target_dir: Path, dataset_root: Path, yaml_name: str = "rdd2022.yaml") -> None:
     yaml_content = (
         f"path: {target_dir}\n"
         f"train: images/train\n"
@@ -260,7 +1869,7 @@ def write_data_yaml(target_dir: Path, dataset_root: Path) -> None:
         f"nc: {len(CLASS_NAMES)}\n"
         f"names: {CLASS_NAMES}\n"
     )
-    data_yaml = dataset_root / "rdd2022.yaml"
+    data_yaml = dataset_root / yaml_name
     data_yaml.write_text(yaml_content, encoding="utf-8")
     logging.info("Saved YOLO data config to %s", data_yaml)
 
@@ -276,8 +1885,112 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser.add_argument("--train-ratio", type=float, default=0.8, help="Train split ratio.")
     parser.add_argument("--val-ratio", type=float, default=0.15, help="Validation split ratio.")
     parser.add_argument("--seed", type=int, default=42, help="Random seed for shuffling.")
+    parser.add_argument(
+        "--split-strategy",
+        dest="split_strategy",
+        choices=SPLIT_STRATEGIES,
+        default="random",
+        help="'stratified' balances splits on region and per-class box counts.",
+    )
     parser.add_argument("--extract-zips", action="store_true", help="Extract region ZIP files if found.")
     parser.add_argument("--force-extract", action="store_true", help="Force re-extraction of ZIP files.")
+    parser.add_argument(
+        "--verify-extracted",
+        dest="verify_extracted",
+        action="store_true",
+        help="CRC-check every extracted member against its archive, not just newly extracted ones.",
+    )
+    parser.add_argument(
+        "--stream-zips",
+        dest="stream_zips",
+        action="store_true",
+        help="Read annotations and images directly from region ZIPs instead of extracting them.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Parallel workers for parsing annotations and writing splits (1 = serial).",
+    )
+    parser.add_argument(
+        "--no-image-index",
+        dest="image_index",
+        action="store_false",
+        help="Probe the filesystem per annotation instead of pre-indexing images.",
+    )
+    parser.add_argument(
+        "--xml-parser",
+        dest="xml_parser",
+        choices=XML_BACKENDS,
+        default="etree",
+        help="VOC parser backend (lxml must be installed separately).",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="off",
+        help="Near-duplicate handling: 'group' keeps each group in one split, 'drop' keeps one image per group.",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        dest="dedup_threshold",
+        type=int,
+        default=4,
+        help="Maximum Hamming distance (0-63) between 64-bit image hashes to count as near-duplicates.",
+    )
+    parser.add_argument(
+        "--link-mode",
+        dest="link_mode",
+        choices=LINK_MODES,
+        default="copy",
+        help="How to place images in the output tree; 'auto' tries reflink, hardlink, then copy.",
+    )
+    parser.add_argument(
+        "--cache-imgsz",
+        dest="cache_imgsz",
+        type=int,
+        default=None,
+        help="Also write a copy of the splits resized to this training size, plus rdd2022_<imgsz>.yaml pointing at it.",
+    )
+    parser.add_argument(
+        "--tile-size",
+        dest="tile_size",
+        type=int,
+        default=None,
+        help="Also cut images into overlapping square tiles of this size, plus rdd2022_tiles_<size>.yaml.",
+    )
+    parser.add_argument(
+        "--tile-overlap",
+        dest="tile_overlap",
+        type=float,
+        default=0.2,
+        help="Fraction of the tile size shared by neighbouring tiles.",
+    )
+    parser.add_argument(
+        "--tile-min-visibility",
+        dest="tile_min_visibility",
+        type=float,
+        default=0.5,
+        help="Drop tile boxes keeping less than this fraction of their area.",
+    )
+    parser.add_argument(
+        "--shards",
+        action="store_true",
+        help="Also pack each split into tar shards under shards/<split>/ for fast transfer.",
+    )
+    parser.add_argument(
+        "--shard-size-mb",
+        dest="shard_size_mb",
+        type=int,
+        default=1024,
+        help="Target size of each tar shard in MB.",
+    )
+    parser.add_argument(
+        "--full-rebuild",
+        dest="full_rebuild",
+        action="store_true",
+        help="Ignore the output manifest and rewrite every image and label.",
+    )
     parser.add_argument("--verbose", action="store_true", help="Enable debug logging.")
     return parser.parse_args(argv)
 
@@ -291,26 +2004,90 @@ def main(argv: Optional[List[str]] = None) -> int:
         logging.error("Raw dataset directory %s does not exist. Run download script first.", raw_dir)
         return 1
 
+    zip_files = find_region_zips(raw_dir) if args.stream_zips else []
+    if args.stream_zips and not zip_files:
+        logging.warning("--stream-zips given but no ZIP files found under %s", raw_dir)
+
     # Extract ZIP files if needed
-    if args.extract_zips or list(raw_dir.rglob("*.zip")):
-        annotation_dir = extract_region_zips(raw_dir, force=args.force_extract)
+    if zip_files:
+        annotation_dir = raw_dir
+        if args.link_mode != "copy":
+            logging.info("Images streamed from ZIPs are always written as copies; ignoring --link-mode")
+    elif args.extract_zips or list(raw_dir.rglob("*.zip")):
+        try:
+            annotation_dir = extract_region_zips(
+                raw_dir, force=args.force_extract, jobs=args.jobs, verify_all=args.verify_extracted
+            )
+        except RuntimeError as e:
+            logging.error("%s", e)
+            return 1
     else:
         annotation_dir = raw_dir
     
     output_dir = Path(args.output_dir).expanduser().resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    samples = collect_annotations(annotation_dir)
+    if args.tile_size and not 0.0 <= args.tile_overlap < 1.0:
+        logging.error("--tile-overlap must be in [0, 1)")
+        return 1
+    if args.dedup != "off" and not 0 <= args.dedup_threshold < 64:
+        logging.error("--dedup-threshold must be in [0, 63] for 64-bit image hashes")
+        return 1
+    if args.xml_parser == "lxml" and lxml_etree is None:
+        logging.error("--xml-parser lxml requires lxml (pip install lxml)")
+        return 1
+    if zip_files:
+        samples = collect_zip_annotations(zip_files, jobs=args.jobs, xml_backend=args.xml_parser)
+    else:
+        samples = collect_annotations(
+            annotation_dir, jobs=args.jobs, use_index=args.image_index, xml_backend=args.xml_parser
+        )
     if not samples:
         logging.error("No annotations found under %s", annotation_dir)
         return 1
 
-    splits = split_dataset(samples, args.train_ratio, args.val_ratio, args.seed)
+    group_ids = None
+    if args.dedup != "off":
+        hashes = compute_image_hashes(samples, jobs=args.jobs, cache_path=output_dir / DEDUP_CACHE_NAME)
+        group_ids = group_near_duplicates(hashes, args.dedup_threshold)
+        if args.dedup == "drop":
+            samples = drop_near_duplicates(samples, group_ids)
+            group_ids = None
+
+    splits = split_dataset(
+        samples, args.train_ratio, args.val_ratio, args.seed, strategy=args.split_strategy, group_ids=group_ids
+    )
+    log_split_balance(splits)
+    linker = ImageLinker(args.link_mode)
+    # Read even under --full-rebuild: outputs the new run drops must still be removed.
+    previous = load_manifest(output_dir)
     for split_name, records in splits.items():
         logging.info("Writing %s split with %d samples", split_name, len(records))
-        write_split(split_name, records, output_dir)
+    manifest = write_splits(
+        splits, output_dir, linker=linker, jobs=args.jobs, previous={} if args.full_rebuild else previous
+    )
+    logging.info("Image materialization: %s", linker.counts)
+    remove_stale_outputs(output_dir, previous, manifest)
+    for split_name, records in splits.items():
+        write_split_table(split_name, records, output_dir)
+    save_manifest(output_dir, manifest)
 
     write_data_yaml(output_dir, output_dir)
+    if args.shards:
+        write_shards(splits, output_dir, manifest, shard_bytes=args.shard_size_mb << 20)
+    if args.cache_imgsz:
+        cache_root = write_image_cache(splits, output_dir, args.cache_imgsz, jobs=args.jobs)
+        write_data_yaml(cache_root, output_dir, yaml_name=f"rdd2022_{args.cache_imgsz}.yaml")
+    if args.tile_size:
+        tiles_root = write_tiles(
+            splits,
+            output_dir,
+            args.tile_size,
+            overlap=args.tile_overlap,
+            min_visibility=args.tile_min_visibility,
+            jobs=args.jobs,
+        )
+        write_data_yaml(tiles_root, output_dir, yaml_name=f"rdd2022_tiles_{args.tile_size}.yaml")
     logging.info("Dataset preparation completed successfully.")
     return 0
 
@@ -4,19 +4,37 @@
 from __future__ import annotations
 
 import argparse
+import copy
+import ctypes
+import functools
+import gc
 import json
 import logging
+import math
+import os
+import socket
+import subprocess
 import sys
+import tempfile
 import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
+import psutil
 import torch
+import torch.distributed as dist
 import yaml
+from torch import nn
+from torch.utils.data import Sampler
 from ultralytics import YOLO
+from ultralytics.data.build import InfiniteDataLoader, seed_worker
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils.torch_utils import strip_optimizer, torch_distributed_zero_first
 import shutil
 
+from prepare_rdd2022 import stage_shards
+
 
 def configure_logger(verbose: bool) -> None:
     level = logging.DEBUG if verbose else logging.INFO
@@ -61,10 +79,34 @@ def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Train YOLOv8 on RDD2022.")
     parser.add_argument("--config", default="configs/training.yaml", help="Path to YAML config file.")
     parser.add_argument("--data-yaml", dest="data_yaml", help="Override dataset YAML path.")
+    parser.add_argument("--shards", help="Train from tar shards written by prepare_rdd2022.py --shards (overrides data YAML).")
+    parser.add_argument(
+        "--shard-stage-dir",
+        dest="shard_stage_dir",
+        help="Local directory the shards are unpacked into (default: <system temp>/rdd2022_shards).",
+    )
     parser.add_argument("--weights", help="Initial weights (e.g., yolov8n.pt).")
     parser.add_argument("--imgsz", type=int, help="Image size for training.")
     parser.add_argument("--epochs", type=int, help="Number of training epochs.")
-    parser.add_argument("--batch", type=int, help="Batch size.")
+    parser.add_argument("--batch", type=parse_batch, help="Batch size, or 'auto' to probe the largest that fits in memory.")
+    parser.add_argument(
+        "--memory-fraction",
+        dest="memory_fraction",
+        type=float,
+        help="Share of device memory (RAM on CPU) --batch auto may use (default 0.85).",
+    )
+    parser.add_argument(
+        "--nominal-batch",
+        dest="nominal_batch",
+        type=int,
+        help="Effective batch per optimizer step; gradients are accumulated over batch-sized steps to reach it.",
+    )
+    parser.add_argument(
+        "--repeat-threshold",
+        dest="repeat_threshold",
+        type=float,
+        help="Enable repeat-factor sampling: images with classes rarer than this image fraction are oversampled.",
+    )
     parser.add_argument("--lr0", type=float, help="Initial learning rate.")
     parser.add_argument("--lrf", type=float, help="Final learning rate fraction.")
     parser.add_argument("--momentum", type=float, help="Optimizer momentum.")
@@ -72,6 +114,18 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--warmup-epochs", dest="warmup_epochs", type=float, help="Warmup epochs.")
     parser.add_argument("--device", help="Compute device (cuda, cpu, mps).")
     parser.add_argument("--workers", type=int, help="Number of dataloader workers.")
+    parser.add_argument(
+        "--nproc",
+        type=int,
+        default=1,
+        help="Data-parallel CPU worker processes (torch.distributed, gloo backend); --batch is the total across them.",
+    )
+    parser.add_argument(
+        "--threads-per-proc",
+        dest="threads_per_proc",
+        type=int,
+        help="Intra-op thread budget of each --nproc worker (default: CPU cores / nproc).",
+    )
     parser.add_argument("--project", help="Ultralytics project directory.")
     parser.add_argument("--run-name", dest="run_name", help="Experiment/run name.")
     parser.add_argument("--seed", type=int, help="Random seed.")
@@ -103,6 +157,223 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+AUTO_BATCH_MAX = 512
+AUTO_BATCH_CACHE = "batch_cache.json"
+
+
+def parse_batch(value: str) -> Union[int, str]:
+    if str(value).lower() == "auto":
+        return "auto"
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"batch must be an integer or 'auto', got {value!r}")
+
+
+def device_memory(device: str) -> Tuple[str, int]:
+    """Identity string and usable memory in bytes of a training device.
+
+    CUDA and MPS report accelerator memory; CPU uses the machine's RAM, with
+    resident set size as the measured quantity.
+    """
+    if device.startswith("cuda"):
+        index = torch.device(device).index or 0
+        props = torch.cuda.get_device_properties(index)
+        return f"cuda:{props.name}:{props.total_memory}", props.total_memory
+    if device == "mps":
+        limit = torch.mps.recommended_max_memory() if hasattr(torch.mps, "recommended_max_memory") else psutil.virtual_memory().total
+        return f"mps:{limit}", limit
+    total = psutil.virtual_memory().total
+    return f"cpu:{total}", total
+
+
+def release_host_memory() -> None:
+    """Hand freed heap memory back to the OS so RSS reflects what is in use."""
+    gc.collect()
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+def output_tensors(output: Any) -> List[torch.Tensor]:
+    """Every tensor in a model output, however the head nests them (tensor, list, tuple or dict)."""
+    if isinstance(output, torch.Tensor):
+        return [output]
+    if isinstance(output, dict):
+        output = list(output.values())
+    if isinstance(output, (list, tuple)):
+        return [tensor for item in output for tensor in output_tensors(item)]
+    return []
+
+
+def probe_batch_memory(model: torch.nn.Module, batch: int, imgsz: int, device: str) -> int:
+    """Peak memory in bytes of one forward and backward pass at ``batch``."""
+    process = psutil.Process()
+    if device.startswith("cuda"):
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats(device)
+    else:
+        # Otherwise RSS still holds what a larger, earlier probe freed.
+        release_host_memory()
+    images = torch.rand(batch, 3, imgsz, imgsz, device=device)
+    on_cuda = device.startswith("cuda")
+    with torch.autocast(device_type="cuda" if on_cuda else "cpu", enabled=on_cuda):
+        outputs = [tensor for tensor in output_tensors(model(images)) if tensor.requires_grad]
+        # Stand-in loss touching every output, so backward allocates every gradient the real loss would.
+        loss = torch.stack([tensor.float().mean() for tensor in outputs]).sum()
+    peak = process.memory_info().rss
+    loss.backward()
+    model.zero_grad(set_to_none=True)
+    if device.startswith("cuda"):
+        torch.cuda.synchronize(device)
+        return torch.cuda.max_memory_reserved(device)
+    if device == "mps":
+        torch.mps.synchronize()
+        return torch.mps.driver_allocated_memory()
+    return max(peak, process.memory_info().rss)
+
+
+def find_max_batch(
+    model: torch.nn.Module, imgsz: int, device: str, budget: float, limit: float, max_batch: int = AUTO_BATCH_MAX
+) -> Dict[str, Any]:
+    """Largest batch whose training step stays within ``budget`` bytes.
+
+    Batch sizes double from 1 until a step runs out of memory, crosses the
+    budget or reaches ``max_batch``; a binary search then narrows the gap
+    between the last batch that fit and the first that did not. ``limit``
+    is the device's whole memory: host RAM has no clean out-of-memory
+    error, so a batch the trend of the probes puts above it is counted as a
+    failure without being run.
+    """
+    model.train()
+    for param in model.parameters():
+        param.requires_grad_(True)
+    probes: Dict[int, int] = {}
+
+    def fits(batch: int) -> bool:
+        known = sorted(probes.items())
+        if len(known) >= 2:
+            (b0, m0), (b1, m1) = known[-2], known[-1]
+            if batch > b1 and m1 + (m1 - m0) / (b1 - b0) * (batch - b1) > limit:
+                logging.info("Auto-batch probe: batch %d would exceed device memory; not run", batch)
+                return False
+        try:
+            used = probe_batch_memory(model, batch, imgsz, device)
+        except (RuntimeError, MemoryError) as e:
+            if "out of memory" not in str(e).lower() and not isinstance(e, MemoryError):
+                raise
+            logging.info("Auto-batch probe: batch %d ran out of memory", batch)
+            return False
+        finally:
+            if device.startswith("cuda"):
+                torch.cuda.empty_cache()
+            elif device == "mps":
+                torch.mps.empty_cache()
+        probes[batch] = used
+        logging.info("Auto-batch probe: batch %d uses %.2f GB of %.2f GB budget", batch, used / 1e9, budget / 1e9)
+        return used <= budget
+
+    low, high = 0, max_batch + 1
+    batch = 1
+    while batch <= max_batch:
+        if not fits(batch):
+            high = batch
+            break
+        low = batch
+        batch *= 2
+    if low == 0:
+        logging.warning("Even batch 1 exceeds the memory budget; using batch 1")
+        return {"batch": 1, "probes": sorted(probes.items())}
+    while high - low > 1:
+        mid = (low + high) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid
+    return {"batch": low, "probes": sorted(probes.items())}
+
+
+def resolve_auto_batch(weights: str, imgsz: int, device: str, fraction: float, cache_path: Path, share: int = 1) -> int:
+    """``--batch auto``: probe the batch size once per (model, imgsz, device) and cache it.
+
+    With ``share`` > 1 the device is split between that many processes and
+    the batch is sized for one of them.
+    """
+    device_id, memory = device_memory(device)
+    limit = memory / share
+    model_id = str(Path(weights).resolve()) if Path(weights).exists() else weights
+    key = f"{model_id}|{imgsz}|{device_id}|{fraction}|{share}"
+    cache: Dict[str, Any] = {}
+    if cache_path.exists():
+        try:
+            cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        except ValueError:
+            cache = {}
+    if key in cache:
+        logging.info("Auto-batch: using cached batch %d for %s", cache[key]["batch"], key)
+        return int(cache[key]["batch"])
+
+    start = time.time()
+    model = YOLO(weights).model.to(device)
+    result = find_max_batch(model, imgsz, device, fraction * limit, limit)
+    del model
+    result["probe_seconds"] = round(time.time() - start, 1)
+    cache[key] = result
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    logging.info(
+        "Auto-batch: batch %d fits under %.0f%% of %s memory%s",
+        result["batch"],
+        fraction * 100,
+        device,
+        f" (1/{share} share)" if share > 1 else "",
+    )
+    return int(result["batch"])
+
+
+def gradient_accumulation(batch: int, nominal_batch: int, weight_decay: float, warmup_epochs: float) -> Dict[str, Any]:
+    """Accumulation plan Ultralytics will derive from ``batch`` and ``nbs``.
+
+    The trainer steps the optimizer every ``round(nbs / batch)`` batches and
+    scales weight decay by ``batch * accumulate / nbs``; the learning rate is
+    per optimizer step and so needs no scaling while the effective batch is
+    held at ``nbs``. During warmup the accumulation count ramps up from 1.
+    """
+    accumulate = max(round(nominal_batch / batch), 1)
+    effective = batch * accumulate
+    plan = {
+        "accumulate": accumulate,
+        "effective_batch": effective,
+        "weight_decay": weight_decay * effective / nominal_batch,
+    }
+    logging.info(
+        "Gradient accumulation: batch %d x %d steps = effective batch %d (nominal %d)",
+        batch,
+        accumulate,
+        effective,
+        nominal_batch,
+    )
+    logging.info(
+        "LR/warmup scaling: lr0 applies per optimizer step (unscaled), weight decay %.6g -> %.6g, "
+        "accumulation ramps 1 -> %d over %.1f warmup epochs",
+        weight_decay,
+        plan["weight_decay"],
+        accumulate,
+        warmup_epochs,
+    )
+    if effective != nominal_batch:
+        logging.warning(
+            "Batch %d does not divide nominal batch %d; effective batch is %d. "
+            "Pick a batch that divides it to keep the effective batch exact.",
+            batch,
+            nominal_batch,
+            effective,
+        )
+    return plan
+
+
 def merge_settings(args: argparse.Namespace, cfg: Dict[str, Any]) -> tuple[Dict[str, Any], Dict[str, Any]]:
     settings: Dict[str, Any] = {}
     extras: Dict[str, Any] = {}
@@ -114,6 +385,17 @@ def merge_settings(args: argparse.Namespace, cfg: Dict[str, Any]) -> tuple[Dict[
     settings["model"] = str(weights)
 
     settings["imgsz"] = getattr(args, "imgsz") or resolve(cfg, "model", "imgsz", 640)
+    schedule = resolve(cfg, "model", "imgsz_schedule")
+    if schedule and getattr(args, "imgsz"):
+        logging.info("--imgsz given; ignoring model.imgsz_schedule")
+    elif schedule:
+        extras["imgsz_schedule"] = parse_imgsz_schedule(schedule)
+        # Validation, checkpoints and --batch auto all use the final, largest size.
+        settings["imgsz"] = extras["imgsz_schedule"][-1][1]
+        logging.info(
+            "Progressive resizing: %s",
+            ", ".join(f"{size} from epoch {start}" for start, size in extras["imgsz_schedule"]),
+        )
     settings["epochs"] = getattr(args, "epochs") or resolve(cfg, "optim", "epochs", 100)
     settings["batch"] = getattr(args, "batch") or resolve(cfg, "optim", "batch", 16)
     settings["lr0"] = getattr(args, "lr0") or resolve(cfg, "optim", "lr0", 0.01)
@@ -217,11 +499,458 @@ def merge_settings(args: argparse.Namespace, cfg: Dict[str, Any]) -> tuple[Dict[
     if val_iou is not None:
         settings["iou"] = val_iou
 
+    if str(settings["batch"]).lower() == "auto":
+        fraction = float(getattr(args, "memory_fraction") or resolve(cfg, "hardware", "memory_fraction", 0.85))
+        nproc = max(1, getattr(args, "nproc", 1) or 1)
+        # --nproc ranks train on CPU and split its RAM; size one rank's batch on that share.
+        per_rank = resolve_auto_batch(
+            settings["model"],
+            int(settings["imgsz"]),
+            "cpu" if nproc > 1 else settings["device"],
+            fraction,
+            Path(settings["project"]) / AUTO_BATCH_CACHE,
+            share=nproc,
+        )
+        settings["batch"] = per_rank * nproc
+
+    # optim.nominal_batch (or --nominal-batch) is the effective batch per optimizer
+    # step and becomes Ultralytics' nbs; unset, nbs keeps its default of 64, so
+    # configs only need the key to ask for something else.
+    nominal_batch = getattr(args, "nominal_batch") or resolve(cfg, "optim", "nominal_batch")
+    if nominal_batch:
+        settings["nbs"] = int(nominal_batch)
+        extras["accumulation"] = gradient_accumulation(
+            int(settings["batch"]),
+            settings["nbs"],
+            float(settings["weight_decay"]),
+            float(settings["warmup_epochs"]),
+        )
+
+    repeat_threshold = getattr(args, "repeat_threshold")
+    if repeat_threshold is None:
+        repeat_threshold = resolve(cfg, "augmentation", "repeat_threshold")
+    if repeat_threshold is None:
+        repeat_threshold = resolve(cfg, "optim", "repeat_threshold")
+    extras["repeat_threshold"] = float(repeat_threshold or 0.0)
+
     extras["weights_dir"] = resolve(cfg, "paths", "weights_dir")
+    extras["shards"] = getattr(args, "shards") or resolve(cfg, "paths", "shards")
+    extras["shard_stage_dir"] = getattr(args, "shard_stage_dir") or resolve(
+        cfg, "paths", "shard_stage_dir", str(Path(tempfile.gettempdir()) / "rdd2022_shards")
+    )
 
     return settings, extras
 
 
+def compute_repeat_factors(classes_per_image: Sequence[Sequence[int]], threshold: float) -> List[float]:
+    """LVIS repeat factors, one per image.
+
+    A class present in a fraction ``f_c`` of the images gets
+    ``r_c = max(1, sqrt(threshold / f_c))``; an image repeats by the largest
+    ``r_c`` among its classes, so images without rare classes keep 1.0.
+    """
+    num_images = max(len(classes_per_image), 1)
+    image_counts: Dict[int, int] = {}
+    for classes in classes_per_image:
+        for cls in set(classes):
+            image_counts[cls] = image_counts.get(cls, 0) + 1
+    class_repeat = {
+        cls: max(1.0, math.sqrt(threshold / (count / num_images))) for cls, count in image_counts.items()
+    }
+    factors = [max((class_repeat[cls] for cls in classes), default=1.0) for classes in classes_per_image]
+
+    for cls in sorted(class_repeat):
+        logging.info(
+            "  class %d: in %.2f%% of images, repeat factor %.2f",
+            cls,
+            100.0 * image_counts[cls] / num_images,
+            class_repeat[cls],
+        )
+    return factors
+
+
+class RepeatFactorSampler(Sampler):
+    """Per-epoch index stream with images repeated by their repeat factor.
+
+    Each epoch draws ``floor(r) + Bernoulli(frac(r))`` copies of every image
+    (stochastic rounding, as in LVIS), shuffles them with ``seed + epoch``
+    (shared by all ranks, epoch from :meth:`set_epoch`) and hands each rank
+    an interleaved shard. The epoch length is fixed
+    at the expected total, so the trainer's batches-per-epoch stays constant.
+    """
+
+    def __init__(self, factors: List[float], seed: int = 0, rank: int = -1, world_size: int = 1) -> None:
+        self.factors = torch.tensor(factors, dtype=torch.float64)
+        self.seed = seed
+        self.rank = max(rank, 0)
+        self.world_size = world_size
+        self.epoch = 0
+        self.num_samples = int(self.factors.sum().item()) // world_size
+
+    def set_epoch(self, epoch: int) -> None:
+        """Select the epoch whose draw and order ``__iter__`` yields; nothing else advances it."""
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        whole = self.factors.floor()
+        repeats = whole + (torch.rand(len(self.factors), generator=generator, dtype=torch.float64) < self.factors - whole)
+        indices = torch.repeat_interleave(torch.arange(len(self.factors)), repeats.long())
+        indices = indices[torch.randperm(len(indices), generator=generator)]
+        total = self.num_samples * self.world_size
+        if len(indices) < total:
+            indices = indices.repeat(total // max(len(indices), 1) + 1)
+        return iter(indices[:total][self.rank :: self.world_size].tolist())
+
+
+class RepeatFactorTrainer(DetectionTrainer):
+    """DetectionTrainer whose training loader samples by LVIS repeat factors.
+
+    ``repeat_threshold`` of 0 keeps the stock loader. The factors come from
+    the class ids the dataset itself loaded (its label cache, after pruning
+    corrupt images), so they line up with the images the loader serves.
+    """
+
+    def __init__(self, *args: Any, repeat_threshold: float = 0.0, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.repeat_threshold = repeat_threshold
+        if repeat_threshold:
+            self.add_callback("on_train_epoch_start", RepeatFactorTrainer._set_sampler_epoch)
+
+    @staticmethod
+    def _set_sampler_epoch(trainer: "RepeatFactorTrainer") -> None:
+        # The stock loop only does this under DDP; single-process runs need it too.
+        sampler = trainer.train_loader.sampler
+        if isinstance(sampler, RepeatFactorSampler):
+            sampler.set_epoch(trainer.epoch)
+
+    def get_dataloader(self, dataset_path: str, batch_size: int = 16, rank: int = 0, mode: str = "train"):
+        if mode != "train" or not self.repeat_threshold:
+            return super().get_dataloader(dataset_path, batch_size, rank, mode)
+        with torch_distributed_zero_first(rank):
+            dataset = self.build_dataset(dataset_path, mode, batch_size)
+        classes_per_image = [label["cls"].reshape(-1).astype(int).tolist() for label in dataset.labels]
+        factors = compute_repeat_factors(classes_per_image, self.repeat_threshold)
+        world_size = int(os.environ.get("WORLD_SIZE", 1))
+        sampler = RepeatFactorSampler(factors, seed=self.args.seed, rank=rank, world_size=world_size)
+        logging.info(
+            "Repeat-factor sampling (threshold %g): %d images -> %d samples per epoch",
+            self.repeat_threshold,
+            len(factors),
+            len(sampler) * world_size,
+        )
+        generator = torch.Generator()
+        generator.manual_seed(6148914691236517205 + max(rank, 0))
+        return InfiniteDataLoader(
+            dataset=dataset,
+            batch_size=batch_size,
+            shuffle=False,
+            num_workers=min(os.cpu_count() or 1, self.args.workers),
+            sampler=sampler,
+            pin_memory=self.device.type == "cuda",
+            collate_fn=getattr(dataset, "collate_fn", None),
+            worker_init_fn=seed_worker,
+            generator=generator,
+        )
+
+
+IMGSZ_STRIDE = 32
+
+
+def parse_imgsz_schedule(raw: Any) -> List[Tuple[int, int]]:
+    """Normalise ``model.imgsz_schedule`` to sorted ``(start_epoch, imgsz)`` pairs.
+
+    Accepts a mapping ``{0: 416, 60: 512, 140: 640}`` or a list of
+    ``[start_epoch, imgsz]`` pairs. Epochs are 0-based, like the trainer's.
+    """
+    pairs = raw.items() if isinstance(raw, dict) else raw
+    try:
+        schedule = sorted((int(start), int(size)) for start, size in pairs)
+    except (TypeError, ValueError):
+        raise ValueError(f"model.imgsz_schedule must map start epochs to image sizes, got {raw!r}")
+    if not schedule or schedule[0][0] != 0:
+        raise ValueError("model.imgsz_schedule must start at epoch 0")
+    for _, size in schedule:
+        if size <= 0 or size % IMGSZ_STRIDE:
+            raise ValueError(f"imgsz_schedule size {size} is not a positive multiple of {IMGSZ_STRIDE}")
+    return schedule
+
+
+def scheduled_imgsz(schedule: List[Tuple[int, int]], epoch: int) -> int:
+    size = schedule[0][1]
+    for start, value in schedule:
+        if epoch >= start:
+            size = value
+    return size
+
+
+def make_imgsz_callback(schedule: List[Tuple[int, int]]):
+    """Epoch-start callback that resizes the training set in place.
+
+    The size is derived from the trainer's current epoch alone, so a resumed
+    run picks up at the right stage. The train dataset gets its new size and
+    rebuilt transforms, and the loader respawns its workers to see them; the
+    optimizer, EMA and LR schedule carry on untouched.
+    """
+
+    def apply_imgsz(trainer: Any) -> None:
+        size = scheduled_imgsz(schedule, trainer.epoch)
+        dataset = trainer.train_loader.dataset
+        if dataset.imgsz == size:
+            return
+        logging.info("Epoch %d: training image size %d -> %d", trainer.epoch + 1, dataset.imgsz, size)
+        dataset.imgsz = size
+        # Drop images already loaded at the previous size.
+        dataset.ims = [None] * len(dataset.ims)
+        dataset.im_hw0 = [None] * len(dataset.im_hw0)
+        dataset.im_hw = [None] * len(dataset.im_hw)
+        dataset.buffer = []
+        hyp = copy.copy(trainer.args)
+        if trainer.epoch > trainer.epochs - trainer.args.close_mosaic:
+            # Past the mosaic cut-off the trainer will not close it again for us.
+            hyp.mosaic = 0.0
+            dataset.close_mosaic(hyp)
+        else:
+            dataset.transforms = dataset.build_transforms(hyp=hyp)
+        trainer.train_loader.reset()
+
+    return apply_imgsz
+
+
+SCALING_LOG_NAME = "scaling.json"
+SCALING_CALIBRATION_STEPS = 5
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launch_workers(nproc: int, threads: int) -> int:
+    """Re-run this script as ``nproc`` gloo ranks and wait for all of them.
+
+    Ultralytics reads ``RANK``/``LOCAL_RANK``/``WORLD_SIZE`` at import time, so
+    each rank is a fresh interpreter with its environment set up front, the
+    same way ``torchrun`` launches workers.
+    """
+    port = free_port()
+    procs: List[subprocess.Popen] = []
+    for rank in range(nproc):
+        env = dict(os.environ)
+        env.update(
+            RANK=str(rank),
+            LOCAL_RANK=str(rank),
+            WORLD_SIZE=str(nproc),
+            MASTER_ADDR="127.0.0.1",
+            MASTER_PORT=str(port),
+            OMP_NUM_THREADS=str(threads),
+            MKL_NUM_THREADS=str(threads),
+        )
+        procs.append(subprocess.Popen([sys.executable, *sys.argv], env=env))
+    logging.info("Launched %d CPU workers with %d threads each (gloo on port %d)", nproc, threads, port)
+
+    exit_code = 0
+    try:
+        while procs:
+            for proc in list(procs):
+                code = proc.poll()
+                if code is None:
+                    continue
+                procs.remove(proc)
+                if code != 0 and exit_code == 0:
+                    # A dead rank leaves the others blocked in a collective; stop them.
+                    logging.error("Worker %d exited with code %d; stopping the remaining workers", proc.pid, code)
+                    exit_code = code
+                    for other in procs:
+                        other.terminate()
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.terminate()
+        raise
+    return exit_code
+
+
+def ddp_worker_settings(settings: Dict[str, Any], world_size: int) -> None:
+    """Turn the run-wide settings into one CPU rank's share of them."""
+    total = int(settings["batch"])
+    if total < world_size:
+        raise ValueError(f"--batch {total} is smaller than --nproc {world_size}")
+    settings["batch"] = total // world_size
+    # Ultralytics derives accumulation from nbs / batch; scaling both by the
+    # world size keeps the effective batch (and weight decay) of the whole run.
+    settings["nbs"] = max(int(settings.get("nbs", 64)) // world_size, settings["batch"])
+    settings["device"] = "cpu"
+    # Each rank would settle AMP on its own; it is a no-op on CPU anyway.
+    settings["amp"] = False
+    settings["workers"] = max(1, int(settings["workers"]) // world_size)
+
+
+class CPUDistributedTrainer(RepeatFactorTrainer):
+    """DetectionTrainer running data-parallel over gloo on CPU ranks.
+
+    The stock trainer only knows CUDA DDP: it pins a GPU per rank and passes
+    ``device_ids`` to DistributedDataParallel. Here the process group is
+    gloo, the model stays on CPU and is wrapped without device ids. Sharded
+    sampling, rank-0 checkpointing and the validation sync come from the
+    stock trainer, which keys them off ``RANK``/``LOCAL_RANK``.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # The stock trainer counts CUDA devices (0 for cpu) and would spawn
+        # its own workers; these processes already are the workers.
+        self.world_size = int(os.environ["WORLD_SIZE"])
+        self.ddp = False
+        self.rank = int(os.environ["RANK"])
+        # Single-process baseline per training image size, filled on rank 0.
+        self.single_rates: Dict[int, float] = {}
+        self.epoch_imgsz = 0
+        self.epoch_start = 0.0
+        self.scaling: List[Dict[str, Any]] = []
+        self.add_callback("on_train_epoch_start", CPUDistributedTrainer._start_epoch)
+        self.add_callback("on_train_epoch_end", CPUDistributedTrainer._report_scaling)
+
+    def _setup_ddp(self) -> None:
+        torch.set_num_threads(int(os.environ.get("OMP_NUM_THREADS", torch.get_num_threads())))
+        dist.init_process_group(backend="gloo", rank=self.rank, world_size=self.world_size)
+        self.device = torch.device("cpu")
+
+    def _setup_train(self) -> None:
+        # Build loaders/optimizer as a single process (batch is already per-rank),
+        # then wrap for gradient all-reduce the CPU way.
+        world_size, self.world_size = self.world_size, 1
+        try:
+            super()._setup_train()
+        finally:
+            self.world_size = world_size
+        self.model = nn.parallel.DistributedDataParallel(
+            self.model, find_unused_parameters=True, broadcast_buffers=False
+        )
+
+    def _build_train_pipeline(self) -> None:
+        # Loaders rebuilt mid-run must not split the per-rank batch again.
+        world_size, self.world_size = self.world_size, 1
+        try:
+            super()._build_train_pipeline()
+        finally:
+            self.world_size = world_size
+
+    def final_eval(self) -> None:
+        # The stock re-validation of best.pt builds its model on the current
+        # CUDA device of any rank; only strip the checkpoints here and leave
+        # best.pt to the evaluation main() runs on rank 0.
+        if self.rank == 0:
+            for checkpoint in (self.last, self.best):
+                if checkpoint.exists():
+                    strip_optimizer(checkpoint)
+        dist.barrier()
+
+    @staticmethod
+    def _calibrate(trainer: "CPUDistributedTrainer", imgsz: int) -> None:
+        """Time one process on all the ranks' cores: the baseline the ranks are compared with.
+
+        Rank 0 trains a copy of the model on a fixed synthetic batch of the
+        full (all-rank) batch size at ``imgsz``, with the thread budget of
+        every rank combined, while the other ranks wait; the real loaders and
+        weights are untouched, so every rank starts the epoch in step. The
+        baseline is compute only: it leaves out data loading, augmentation
+        and the gradient all-reduce, which the per-epoch rate includes, so
+        the reported efficiency is a lower bound on the compute scaling.
+        """
+        dist.barrier()
+        if trainer.rank == 0:
+            rank_threads = torch.get_num_threads()
+            torch.set_num_threads(rank_threads * trainer.world_size)
+            try:
+                rate = CPUDistributedTrainer._single_process_rate(trainer, imgsz)
+            finally:
+                torch.set_num_threads(rank_threads)
+            trainer.single_rates[imgsz] = rate
+            logging.info(
+                "Single-process baseline at imgsz %d (%d threads, no data loading): %.1f img/s",
+                imgsz,
+                rank_threads * trainer.world_size,
+                rate,
+            )
+        dist.barrier()
+
+    @staticmethod
+    def _single_process_rate(trainer: "CPUDistributedTrainer", imgsz: int) -> float:
+        module = copy.deepcopy(trainer.model.module)
+        module.train()
+        optimizer = torch.optim.SGD(module.parameters(), lr=0.0)
+        images = trainer.batch_size * trainer.world_size
+        # One centred box per image; the loss only needs well-formed targets.
+        batch = {
+            "img": torch.rand(images, 3, imgsz, imgsz),
+            "batch_idx": torch.arange(images, dtype=torch.float32),
+            "cls": torch.zeros(images, 1),
+            "bboxes": torch.tensor([[0.5, 0.5, 0.2, 0.2]]).repeat(images, 1),
+        }
+        for step in range(SCALING_CALIBRATION_STEPS + 1):
+            if step == 1:
+                start = time.perf_counter()  # first step warms up the loss and allocator
+            loss, _ = module(batch)
+            loss.sum().backward()
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+        return SCALING_CALIBRATION_STEPS * images / (time.perf_counter() - start)
+
+    @staticmethod
+    def _start_epoch(trainer: "CPUDistributedTrainer") -> None:
+        # Runs after any imgsz-schedule callback, so this is the epoch's size;
+        # every rank sees the same size and joins the calibration barriers.
+        trainer.epoch_imgsz = int(trainer.train_loader.dataset.imgsz)
+        if trainer.epoch_imgsz not in trainer.single_rates:
+            CPUDistributedTrainer._calibrate(trainer, trainer.epoch_imgsz)
+            trainer.single_rates.setdefault(trainer.epoch_imgsz, 0.0)
+        trainer.epoch_start = time.perf_counter()
+
+    @staticmethod
+    def _report_scaling(trainer: "CPUDistributedTrainer") -> None:
+        single_rate = trainer.single_rates.get(trainer.epoch_imgsz)
+        if trainer.rank != 0 or not single_rate:
+            return
+        elapsed = time.perf_counter() - trainer.epoch_start
+        images = len(trainer.train_loader) * trainer.batch_size * trainer.world_size
+        rate = images / elapsed
+        speedup = rate / single_rate
+        record = {
+            "epoch": trainer.epoch + 1,
+            "imgsz": trainer.epoch_imgsz,
+            "seconds": round(elapsed, 2),
+            "images_per_second": round(rate, 2),
+            "single_process_images_per_second": round(single_rate, 2),
+            "speedup_vs_single_process": round(speedup, 3),
+            "efficiency": round(speedup / trainer.world_size, 3),
+        }
+        trainer.scaling.append(record)
+        logging.info(
+            "Epoch %d: %.1f img/s on %d workers at imgsz %d, %.2fx one process on the same cores "
+            "(efficiency %.0f%%)",
+            record["epoch"],
+            rate,
+            trainer.world_size,
+            trainer.epoch_imgsz,
+            speedup,
+            100 * record["efficiency"],
+        )
+        scaling_path = Path(trainer.save_dir) / SCALING_LOG_NAME
+        report = {
+            "world_size": trainer.world_size,
+            "threads_per_worker": torch.get_num_threads(),
+            "baseline": "single process, all worker threads, synthetic batch",
+            "epochs": trainer.scaling,
+        }
+        scaling_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
 def compute_model_stats(model: YOLO) -> Dict[str, Any]:
     """Compute model statistics: size, parameters, FLOPs."""
     stats = {}
@@ -656,8 +1385,36 @@ def main() -> int:
     args = parse_args()
     configure_logger(args.verbose)
 
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    rank = int(os.environ.get("RANK", 0))
+    if rank > 0:
+        logging.getLogger().setLevel(logging.WARNING)
+
     cfg = load_config(args.config)
     overrides, extras = merge_settings(args, cfg)
+    if extras.get("shards"):
+        # Sequential shard reads into local disk; the dataloader then reads local files.
+        data_yaml = stage_shards(
+            Path(extras["shards"]).expanduser().resolve(),
+            Path(extras["shard_stage_dir"]).expanduser().resolve(),
+            jobs=max(1, int(overrides["workers"])),
+        )
+        overrides["data"] = str(data_yaml)
+
+    if args.nproc > 1 and "WORLD_SIZE" not in os.environ:
+        if overrides["device"] != "cpu":
+            logging.warning("--nproc runs CPU workers; ignoring device %s", overrides["device"])
+        threads = args.threads_per_proc or max(1, (os.cpu_count() or 1) // args.nproc)
+        return launch_workers(args.nproc, threads)
+    trainer_cls = None
+    if extras["repeat_threshold"] > 0:
+        trainer_cls = RepeatFactorTrainer
+    if world_size > 1:
+        ddp_worker_settings(overrides, world_size)
+        trainer_cls = CPUDistributedTrainer
+    if trainer_cls is not None:
+        # YOLO.train() builds the trainer from overrides alone; bind the threshold per run.
+        trainer_cls = functools.partial(trainer_cls, repeat_threshold=extras["repeat_threshold"])
 
     logging.info("Training configuration:")
     for key, value in overrides.items():
@@ -666,6 +1423,8 @@ def main() -> int:
     model_path = overrides.pop("model")
     model = YOLO(model_path)
     logging.info("Loaded model %s", model_path)
+    if extras.get("imgsz_schedule"):
+        model.add_callback("on_train_epoch_start", make_imgsz_callback(extras["imgsz_schedule"]))
 
     # Memory management for MPS devices
     device = overrides.get("device", "cpu")
@@ -675,7 +1434,13 @@ def main() -> int:
             torch.mps.empty_cache()
             logging.info("Cleared MPS cache before training")
 
-    trainer_results = model.train(**overrides)
+    trainer_results = model.train(trainer=trainer_cls, **overrides)
+    if world_size > 1:
+        if dist.is_initialized():
+            dist.destroy_process_group()
+        if rank > 0:
+            # Checkpoints and evaluation belong to rank 0.
+            return 0
 
     best_path: Optional[Path] = None
     if hasattr(model, "trainer") and getattr(model.trainer, "best", None):
@@ -0,0 +1,76 @@
+"""Label reading in analyze_dataset must agree with the per-line parser."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import analyze_dataset  # noqa: E402
+
+
+def parser_rows(label_files):
+    rows = [
+        analyze_dataset.annotations_to_rows(index, analyze_dataset.parse_yolo_label(label_file))
+        for index, label_file in enumerate(label_files)
+    ]
+    return np.concatenate(rows)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "0 0.5 0.5\n0.1 0.2 1 0.5 0.5 0.1 0.2\n",  # 3 + 7 fields: same total as two boxes
+        "\n0 0.5 0.5 0.1 0.2 1 0.5 0.5 0.1 0.2\n",  # blank line + 10 fields
+    ],
+)
+def test_misaligned_lines_are_not_split_into_boxes(tmp_path, text):
+    label_file = tmp_path / "bad.txt"
+    label_file.write_text(text)
+    rows, exists = analyze_dataset.load_yolo_labels([label_file])
+    assert exists.tolist() == [True]
+    assert rows.shape == (0, 6)
+    assert analyze_dataset.parse_yolo_label(label_file) == []
+
+
+def test_bulk_path_matches_parser(tmp_path):
+    contents = [
+        "0 0.5 0.5 0.1 0.2\n3 0.25 0.75 0.2 0.1\n",
+        "\n1 0.1 0.1 0.05 0.05\n\n",  # blank lines are skipped, not malformed
+        "2 0.5 0.5 0.1 0.2\r\n4 0.5 0.5 0.3 0.3",  # CRLF, no trailing newline
+        "5 0.5 0.5 0.1\n1 0.5 0.5 0.1 0.2\n",  # one short line, one good line
+    ]
+    label_files = []
+    for index, text in enumerate(contents):
+        label_file = tmp_path / f"{index}.txt"
+        label_file.write_bytes(text.encode())
+        label_files.append(label_file)
+    label_files.append(tmp_path / "missing.txt")
+
+    rows, exists = analyze_dataset.load_yolo_labels(label_files)
+    assert exists.tolist() == [True, True, True, True, False]
+    np.testing.assert_array_equal(rows, parser_rows(label_files))
+
+
+def test_fix_reports_and_keeps_files_with_unparseable_lines(tmp_path):
+    images_dir, labels_dir = tmp_path / "images", tmp_path / "labels"
+    images_dir.mkdir()
+    labels_dir.mkdir()
+    for name in ("keep", "fix"):
+        (images_dir / f"{name}.jpg").write_bytes(b"")
+    keep_text = "9 0.5 0.5 0.1 0.2\n0 0.5 0.5\n1 0.5 0.5 0.1 0.2\n0 x 0.5 0.1 0.2\n2 0.5 0.5 0.1 0.2\n"
+    (labels_dir / "keep.txt").write_text(keep_text)
+    (labels_dir / "fix.txt").write_text("9 0.5 0.5 0.1 0.2\n1 0.5 0.5 0.1 0.2\n")
+
+    stats = analyze_dataset.analyze_split(images_dir, labels_dir, False, True, fix=True)
+
+    assert (labels_dir / "keep.txt").read_text() == keep_text
+    assert (labels_dir / "fix.txt").read_text() == "1 0.500000 0.500000 0.100000 0.200000\n"
+    assert stats["issues"]["fixed_labels"] == [str(labels_dir / "fix.txt")]
+    dropped = [(line["line"], line["reason"]) for line in stats["issues"]["unparseable_lines"]]
+    assert dropped == [(2, "field_count"), (4, "not_numeric"), (5, "after_parse_error")]
+    assert {line["label"] for line in stats["issues"]["unparseable_lines"]} == {str(labels_dir / "keep.txt")}
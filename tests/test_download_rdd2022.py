@@ -0,0 +1,165 @@
+"""Resume behaviour of download_rdd2022 against a local Range-capable HTTP server."""
+
+from __future__ import annotations
+
+import http.server
+import io
+import os
+import re
+import sys
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import download_rdd2022  # noqa: E402
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves in-memory files with Range/If-Range support and injectable disconnects.
+
+    ``files`` maps URL paths to ``(payload, etag)``. With ``fail_after`` set,
+    each response body is cut off after that many bytes and the connection
+    dropped, the way an interrupted transfer looks to the client.
+    """
+
+    files: Dict[str, Tuple[bytes, str]] = {}
+    fail_after: Optional[int] = None
+    requests_seen: List[Tuple[Optional[str], Optional[str], int]] = []
+
+    def do_GET(self) -> None:
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        payload, etag = self.files[self.path]
+        size = len(payload)
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        match = re.match(r"bytes=(\d+)-(\d*)$", range_header or "")
+        start, end = 0, size - 1
+        partial = match is not None and (if_range is None or if_range == etag)
+        if partial:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+        type(self).requests_seen.append((range_header, if_range, 206 if partial else 200))
+        body = payload[start : end + 1]
+        self.send_response(206 if partial else 200)
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if self.fail_after is not None and len(body) > self.fail_after:
+            self.wfile.write(body[: self.fail_after])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    handler = type("Handler", (RangeHandler,), {"files": {}, "fail_after": None, "requests_seen": []})
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    # Small chunks, so an interrupted response still leaves bytes on disk.
+    monkeypatch.setattr(download_rdd2022, "CHUNK_SIZE", 4096)
+    yield handler, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_zip(members: int = 200, member_size: int = 2048) -> Tuple[bytes, Dict[str, bytes]]:
+    contents = {f"RDD2022/{i % 4}/file_{i:03d}.bin": os.urandom(member_size) for i in range(members)}
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        for name, data in contents.items():
+            zf.writestr(name, data)
+    return buffer.getvalue(), contents
+
+
+def test_resume_after_partial_download(server, tmp_path):
+    handler, base = server
+    payload = os.urandom(300_000)
+    handler.files["/data.zip"] = (payload, '"v1"')
+    destination = tmp_path / "data.zip"
+
+    handler.fail_after = 100_000
+    with pytest.raises(requests.RequestException):
+        download_rdd2022.stream_download(f"{base}/data.zip", destination)
+    part = destination.with_name("data.zip.part")
+    assert 0 < part.stat().st_size < len(payload)
+
+    handler.fail_after = None
+    digest = download_rdd2022.stream_download(f"{base}/data.zip", destination)
+    assert destination.read_bytes() == payload
+    assert not part.exists()
+    assert digest == download_rdd2022.file_sha256(destination)
+    range_header, if_range, status = handler.requests_seen[-1]
+    assert range_header is not None and not range_header.startswith("bytes=0-")
+    assert if_range == '"v1"' and status == 206
+
+
+def test_changed_validator_restarts_from_zero(server, tmp_path):
+    handler, base = server
+    handler.files["/data.zip"] = (os.urandom(300_000), '"v1"')
+    destination = tmp_path / "data.zip"
+
+    handler.fail_after = 100_000
+    with pytest.raises(requests.RequestException):
+        download_rdd2022.stream_download(f"{base}/data.zip", destination)
+
+    new_payload = os.urandom(250_000)
+    handler.files["/data.zip"] = (new_payload, '"v2"')
+    handler.fail_after = None
+    download_rdd2022.stream_download(f"{base}/data.zip", destination)
+    assert destination.read_bytes() == new_payload
+
+
+def test_segmented_part_resumes_with_one_segment(server, tmp_path):
+    handler, base = server
+    payload = os.urandom(300_000)
+    handler.files["/data.zip"] = (payload, '"v1"')
+    destination = tmp_path / "data.zip"
+
+    handler.fail_after = 50_000
+    with pytest.raises(requests.RequestException):
+        download_rdd2022.stream_download(f"{base}/data.zip", destination, segments=2)
+
+    handler.fail_after = None
+    download_rdd2022.stream_download(f"{base}/data.zip", destination, segments=1)
+    assert destination.read_bytes() == payload
+    assert not destination.with_name("data.zip.part.json").exists()
+
+
+def test_interrupted_streaming_extraction_resumes(server, tmp_path):
+    handler, base = server
+    payload, contents = make_zip()
+    handler.files["/RDD2022.zip"] = (payload, '"v1"')
+    argv = ["--url", f"{base}/RDD2022.zip", "--output-dir", str(tmp_path), "--segments", "2", "--extract-jobs", "2"]
+
+    handler.fail_after = len(payload) // 4
+    with pytest.raises(requests.RequestException):
+        download_rdd2022.main(argv)
+
+    handler.fail_after = None
+    assert download_rdd2022.main(argv) == 0
+    assert (tmp_path / "RDD2022.zip").read_bytes() == payload
+    for name, data in contents.items():
+        assert (tmp_path / "RDD2022" / name).read_bytes() == data
@@ -0,0 +1,114 @@
+"""CPU checks for the --batch auto memory probe in train_yolov8."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+pytest.importorskip("psutil")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+import train_yolov8  # noqa: E402
+
+MB = 1 << 20
+
+
+def tiny_model() -> torch.nn.Module:
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 4, 3, padding=1),
+        torch.nn.ReLU(),
+        torch.nn.Conv2d(4, 2, 3, padding=1),
+    )
+
+
+def linear_memory(base: int, per_image: int):
+    calls = []
+
+    def probe(model, batch, imgsz, device):
+        calls.append(batch)
+        return base + per_image * batch
+
+    return probe, calls
+
+
+def test_probe_runs_forward_and_backward_on_cpu():
+    model = tiny_model()
+    used = train_yolov8.probe_batch_memory(model, 2, 32, "cpu")
+    assert used > 0
+    assert all(param.grad is None for param in model.parameters())
+
+
+def test_search_finds_largest_batch_under_budget(monkeypatch):
+    probe, calls = linear_memory(base=100 * MB, per_image=3 * MB)
+    monkeypatch.setattr(train_yolov8, "probe_batch_memory", probe)
+    # (250 MB - 100 MB) / 3 MB per image -> 50 images fit, 51 do not.
+    result = train_yolov8.find_max_batch(tiny_model(), 32, "cpu", budget=250 * MB, limit=1000 * MB)
+    assert result["batch"] == 50
+    assert calls[:7] == [1, 2, 4, 8, 16, 32, 64]
+    assert len(calls) <= 7 + 5  # doubling, then a binary search over 32..64
+
+
+def test_search_skips_batches_predicted_over_device_limit(monkeypatch):
+    probe, calls = linear_memory(base=100 * MB, per_image=10 * MB)
+    monkeypatch.setattr(train_yolov8, "probe_batch_memory", probe)
+    # The budget allows 40 images, but the trend puts batch 64 past the
+    # 500 MB device limit, so it must never run.
+    result = train_yolov8.find_max_batch(tiny_model(), 32, "cpu", budget=500 * MB, limit=500 * MB)
+    assert result["batch"] == 40
+    assert max(calls) < 64
+
+
+def test_search_treats_out_of_memory_as_too_large(monkeypatch):
+    def probe(model, batch, imgsz, device):
+        if batch > 20:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+        return batch * MB
+
+    monkeypatch.setattr(train_yolov8, "probe_batch_memory", probe)
+    result = train_yolov8.find_max_batch(tiny_model(), 32, "cpu", budget=1000 * MB, limit=1000 * MB)
+    assert result["batch"] == 20
+
+
+def test_real_cpu_probe_respects_max_batch():
+    result = train_yolov8.find_max_batch(tiny_model(), 32, "cpu", budget=float("inf"), limit=float("inf"), max_batch=6)
+    assert result["batch"] == 6
+
+
+def test_resolve_auto_batch_caches_per_share(monkeypatch, tmp_path):
+    probe, calls = linear_memory(base=0, per_image=MB)
+    monkeypatch.setattr(train_yolov8, "probe_batch_memory", probe)
+    monkeypatch.setattr(train_yolov8, "device_memory", lambda device: ("cpu:fake", 400 * MB))
+    monkeypatch.setattr(train_yolov8, "YOLO", lambda weights: type("Fake", (), {"model": tiny_model()})())
+    cache = tmp_path / "batch_cache.json"
+
+    assert train_yolov8.resolve_auto_batch("tiny.pt", 32, "cpu", 0.5, cache) == 200
+    assert train_yolov8.resolve_auto_batch("tiny.pt", 32, "cpu", 0.5, cache, share=4) == 50
+    probed = len(calls)
+    assert train_yolov8.resolve_auto_batch("tiny.pt", 32, "cpu", 0.5, cache, share=4) == 50
+    assert len(calls) == probed
+
+
+def test_repeat_factors_follow_class_image_fraction():
+    # Class 1 is in 1 of 4 images: r = sqrt(0.5 / 0.25); class 0 is common.
+    factors = train_yolov8.compute_repeat_factors([[0], [0, 1, 1], [0], []], threshold=0.5)
+    assert factors == pytest.approx([1.0, 2**0.5, 1.0, 1.0])
+
+
+def test_repeat_sampler_order_depends_only_on_set_epoch():
+    sampler = train_yolov8.RepeatFactorSampler([1.0, 2.5, 1.0, 1.7], seed=3, rank=1, world_size=2)
+    sampler.set_epoch(4)
+    first = list(sampler)
+    assert list(sampler) == first  # iterating again does not advance the epoch
+    assert len(first) == len(sampler)
+    other = train_yolov8.RepeatFactorSampler([1.0, 2.5, 1.0, 1.7], seed=3, rank=1, world_size=2)
+    other.set_epoch(4)
+    assert list(other) == first
+
+
+def test_repeat_threshold_is_not_class_state():
+    assert not hasattr(train_yolov8.RepeatFactorTrainer, "repeat_threshold")